@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -37,3 +39,12 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def synchronous_thumbnails(settings):
+    """Миниатюры режутся в потоке запроса.
+
+    Задача пула переживала бы тест и его временный MEDIA_ROOT.
+    """
+    settings.THUMBNAIL_WORKERS = 0
@@ -0,0 +1,168 @@
+"""ASGI-вход для проекта на Django 2.2.
+
+В Django 2.2 нет асинхронных view и нет asgiref, поэтому ASGIHandler -
+мост: соединения, чтение тела запроса и отправку ответа ведёт цикл
+событий, а сам Django (view, запросы к базе и кешу) работает в
+ограниченном пуле из ASGI_THREADS потоков. Медленный клиент держит
+только корутину, а не поток воркера, и один процесс обслуживает
+гораздо больше одновременных соединений, чем потоков.
+
+Если в очереди пула уже ASGI_MAX_PENDING запросов, новый сразу получает
+503 с Retry-After: лучше быстро отказать, чем копить соединения, которые
+всё равно дождутся таймаута.
+
+Ответ собирается в потоке целиком: страницы проекта небольшие, а
+потоковые ответы (файлы медиа) в боевом развёртывании отдаёт nginx.
+Статику из STATIC_ROOT отдаёт та же обёртка, что и у WSGI-входа
+(см. staticfiles.py).
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+from .staticfiles import wrap
+
+OVERLOADED_BODY = 'Сервер перегружен, повторите запрос позже.'.encode()
+
+
+def _wsgi_str(value):
+    """Строка WSGI: байты, прочитанные как latin-1 (PEP 3333)."""
+    return value.encode().decode('latin-1')
+
+
+def build_environ(scope, body):
+    """WSGI environ для HTTP-запроса ASGI."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': _wsgi_str(scope.get('root_path', '')),
+        'PATH_INFO': _wsgi_str(scope['path']),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('',))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        if name in environ:
+            # Несколько заголовков Cookie склеиваются, как в одном
+            # заголовке, через '; ', остальные - через запятую
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = f'{environ[name]}{separator}{value}'
+        environ[name] = value
+    return environ
+
+
+def call_wsgi(application, environ):
+    """Выполняет WSGI-приложение: (код, заголовки, тело).
+
+    close() ответа вызывается в том же потоке: по сигналу
+    request_finished Django закрывает соединения с базой этого потока.
+    """
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headers
+        ]
+        return lambda data: chunks.append(data)
+
+    chunks = []
+    response = application(environ, start_response)
+    try:
+        chunks.extend(response)
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return started['status'], started['headers'], b''.join(chunks)
+
+
+class ASGIHandler:
+    """ASGI-приложение поверх WSGIHandler Django."""
+
+    def __init__(self, wsgi_application, threads, max_pending):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix='asgi')
+        self.max_pending = max_pending
+        self.pending = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f"Неподдерживаемый тип ASGI: {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body.extend(message.get('body', b''))
+            if not message.get('more_body', False):
+                return bytes(body)
+
+    async def http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        if self.pending >= self.max_pending:
+            await self.respond(send, 503, [
+                (b'content-type', b'text/plain; charset=utf-8'),
+                (b'retry-after', b'1'),
+            ], OVERLOADED_BODY)
+            return
+        self.pending += 1
+        try:
+            status, headers, content = await asyncio.get_running_loop(
+            ).run_in_executor(
+                self.executor, call_wsgi, self.wsgi_application,
+                build_environ(scope, body))
+        finally:
+            self.pending -= 1
+        await self.respond(send, status, headers, content)
+
+    async def respond(self, send, status, headers, body):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def get_asgi_application():
+    """ASGI-приложение проекта. Настраивает Django, как WSGI-вход."""
+    wsgi_application = wrap(get_wsgi_application())
+    return ASGIHandler(
+        wsgi_application, settings.ASGI_THREADS, settings.ASGI_MAX_PENDING)
@@ -0,0 +1,213 @@
+"""Кеш в файле SQLite, общий для всех процессов одного сервера.
+
+LocMemCache у каждого воркера gunicorn свой: N воркеров держат N копий
+и делят между собой попадания. Этот бэкенд хранит записи в одном
+файле, не требует внешних сервисов и вытесняет давно не читанные
+записи, когда превышены MAX_ENTRIES или MAX_SIZE (байт).
+
+Время последнего чтения обновляется не чаще раза в TOUCH_INTERVAL
+секунд, чтобы чтения почти не брали блокировку на запись. Размер
+проверяется раз в CULL_EVERY записей, поэтому лимиты мягкие.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+
+
+class SQLiteCache(BaseCache):
+    """Кеш Django в файле SQLite с LRU-вытеснением."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self._touch_interval = float(options.get('TOUCH_INTERVAL', 60))
+        self._cull_every = int(options.get('CULL_EVERY', 50))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=self._busy_timeout,
+                isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            self._local.writes = 0
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _fetch(self, keys):
+        """{ключ: (значение, accessed)} для живых записей."""
+        now = time.time()
+        found, expired, stale = {}, [], []
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._db.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                'WHERE key IN ({})'.format(','.join('?' * len(chunk))),
+                chunk,
+            )
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    expired.append(key)
+                    continue
+                found[key] = pickle.loads(value)
+                if accessed < now - self._touch_interval:
+                    stale.append(key)
+        if expired:
+            self._db.executemany(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                [(key, now) for key in expired])
+        if stale:
+            self._db.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(now, key) for key in stale])
+        return found
+
+    def _store(self, items, timeout, mode='REPLACE'):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = []
+        for key, value in items:
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            rows.append((key, blob, expires, now, len(blob)))
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if mode == 'IGNORE':
+                db.executemany(
+                    'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                    [(row[0], now) for row in rows])
+            stored = 0
+            for row in rows:
+                stored += db.execute(
+                    f'INSERT OR {mode} INTO cache '
+                    '(key, value, expires, accessed, size) '
+                    'VALUES (?, ?, ?, ?, ?)', row).rowcount
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        self._local.writes += len(rows)
+        if self._local.writes >= self._cull_every:
+            self._local.writes = 0
+            self._cull()
+        return stored
+
+    def _cull(self):
+        db = self._db
+        db.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count, size = db.execute(
+            'SELECT COUNT(*), TOTAL(size) FROM cache').fetchone()
+        if count <= self._max_entries and size <= self._max_size:
+            return
+        if self._cull_frequency == 0:
+            db.execute('DELETE FROM cache')
+            return
+        db.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (max(count // self._cull_frequency, 1),))
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        mapping = {self._key(key, version): key for key in keys}
+        return {
+            mapping[key]: value
+            for key, value in self._fetch(list(mapping)).items()
+        }
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self._fetch([key])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._store([(self._key(key, version), value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._store(
+            [(self._key(key, version), value) for key, value in data.items()],
+            timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._store(
+            [(self._key(key, version), value)], timeout, mode='IGNORE'))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (blob, len(blob), key))
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return bool(self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ?',
+            (self.get_backend_timeout(timeout), key)).rowcount)
+
+    def delete(self, key, version=None):
+        self._db.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),))
+
+    def delete_many(self, keys, version=None):
+        self._db.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self._key(key, version),) for key in keys])
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт весь срок потока, как и у файлового кеша.
+        pass
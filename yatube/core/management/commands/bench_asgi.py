@@ -0,0 +1,194 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import unquote
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+
+from core.asgi import ASGIHandler
+from posts import benchmark
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI-сервер с постоянным числом потоков, как gunicorn --threads.
+
+    Поток занят соединением целиком, пока клиент передаёт запрос.
+    """
+    request_queue_size = 1024
+
+    def __init__(self, address, threads):
+        super().__init__(address, QuietHandler)
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process, request, client_address)
+
+    def process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+async def serve_asgi(application, reader, writer):
+    """Минимальный HTTP/1.1 для ASGI-приложения: запрос на соединение."""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+        request_line, *lines = head.decode('latin-1').split('\r\n')
+        method, target, version = request_line.split(' ')
+        headers = []
+        for line in filter(None, lines):
+            name, value = line.split(':', 1)
+            headers.append((name.strip().lower().encode('latin-1'),
+                            value.strip().encode('latin-1')))
+        length = int(dict(headers).get(b'content-length', 0))
+        body = await reader.readexactly(length) if length else b''
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        writer.close()
+        return
+    path, _, query = target.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': version.split('/')[-1],
+        'method': method,
+        'scheme': 'http',
+        'path': unquote(path),
+        'query_string': query.encode('latin-1'),
+        'root_path': '',
+        'headers': headers,
+        'client': writer.get_extra_info('peername')[:2],
+        'server': writer.get_extra_info('sockname')[:2],
+    }
+    messages = [{'type': 'http.request', 'body': body}]
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status = message['status']
+            writer.write(
+                f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n'.encode()
+                + b''.join(name + b': ' + value + b'\r\n'
+                           for name, value in message['headers'])
+                + b'connection: close\r\n\r\n')
+        else:
+            writer.write(message.get('body', b''))
+
+    await application(scope, receive, send)
+    await writer.drain()
+    writer.close()
+
+
+async def fetch(port, path, slow):
+    """Один запрос медленного клиента: заголовки приходят в два приёма."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        request = (f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'
+                   'Connection: close\r\n\r\n').encode()
+        half = len(request) // 2
+        writer.write(request[:half])
+        await writer.drain()
+        await asyncio.sleep(slow)
+        writer.write(request[half:])
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    if b' 200 ' not in status_line:
+        raise ValueError(status_line)
+
+
+async def client(port, options, latencies, errors):
+    for _ in range(options['requests']):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                fetch(port, options['path'], options['slow']),
+                options['timeout'])
+        except (asyncio.TimeoutError, OSError, ValueError):
+            errors.append(1)
+        else:
+            latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def load(port, options):
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(port, options, latencies, errors)
+        for _ in range(options['connections'])))
+    return latencies, len(errors), time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузка медленными клиентами на WSGI-сервер с пулом потоков и '
+        'на ASGI-вход с тем же числом потоков для Django.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=200,
+                            help='Одновременных клиентов.')
+        parser.add_argument('--requests', type=int, default=5,
+                            help='Запросов на одного клиента.')
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--slow', type=float, default=0.1,
+                            help='Секунд между частями запроса клиента.')
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--path', default='/')
+
+    def start_wsgi(self, options):
+        server = PooledWSGIServer(('127.0.0.1', 0), options['threads'])
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server.server_address[1], server.shutdown
+
+    def start_asgi(self, options):
+        application = ASGIHandler(
+            get_wsgi_application(), options['threads'],
+            max_pending=options['connections'])
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(
+            lambda reader, writer: serve_asgi(application, reader, writer),
+            '127.0.0.1', 0, backlog=1024))
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        return server.sockets[0].getsockname()[1], lambda: (
+            loop.call_soon_threadsafe(loop.stop))
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            connection.close()
+            connection.settings_dict['NAME'] = os.path.join(
+                directory, 'bench.sqlite3')
+            call_command('migrate', verbosity=0)
+            benchmark.seed(users=100, groups=5, posts=1000, follows=1000,
+                           comments=1000)
+            connection.close()
+            for name, start in (('WSGI', self.start_wsgi),
+                                ('ASGI', self.start_asgi)):
+                port, stop = start(options)
+                latencies, errors, elapsed = asyncio.run(load(port, options))
+                stop()
+                done = len(latencies)
+                p95 = benchmark.percentile(latencies, 0.95) if done else 0
+                self.stdout.write(
+                    f'{name}: {done / elapsed:.0f} запросов/с, '
+                    f'p95 {p95:.0f} мс, ошибок и таймаутов {errors}')
@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+
+def make_cache(backend, location):
+    if backend == 'locmem':
+        return LocMemCache('bench', {'OPTIONS': {'MAX_ENTRIES': 100000}})
+    return SQLiteCache(location, {'OPTIONS': {'MAX_ENTRIES': 100000}})
+
+
+def worker(backend, location, requests, pages, seed, results):
+    """Один воркер: читает страницы с распределением Ципфа."""
+    cache = make_cache(backend, location)
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, pages + 1)]
+    keys = rng.choices(range(pages), weights=weights, k=requests)
+    hits = 0
+    started = time.perf_counter()
+    for key in keys:
+        if cache.get(f'page:{key}') is not None:
+            hits += 1
+        else:
+            cache.set(f'page:{key}', 'x' * 2048, None)
+    results.put((hits, time.perf_counter() - started))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает долю попаданий кеша в памяти процесса и общего '
+        'кеша SQLite при нескольких процессах-воркерах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=5000,
+                            help='Запросов на одного воркера.')
+        parser.add_argument('--pages', type=int, default=2000,
+                            help='Количество разных страниц.')
+
+    def run(self, backend, location, options):
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker, args=(
+                backend, location, options['requests'], options['pages'],
+                seed, results))
+            for seed in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        stats = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        hits = sum(hits for hits, _ in stats)
+        total = options['requests'] * options['workers']
+        elapsed = max(seconds for _, seconds in stats)
+        return hits / total * 100, total / elapsed
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, 'cache.sqlite3')
+            for backend in ('locmem', 'sqlite'):
+                hit_rate, throughput = self.run(backend, location, options)
+                self.stdout.write(
+                    f"{backend:>7}: воркеров {options['workers']}, "
+                    f'попаданий {hit_rate:.1f}%, '
+                    f'{throughput:.0f} запросов/с'
+                )
@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from posts.models import Comment, Post, User
+
+
+def worker(kind, seconds, post_id, user_id, results):
+    """Один процесс: пишет комментарии или читает их, пока не выйдет время.
+
+    Процесс создаётся через fork после закрытия соединения родителя,
+    поэтому открывает своё и получает на нём PRAGMA.
+    """
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            if kind == 'writer':
+                Comment.objects.create(
+                    post_id=post_id, author_id=user_id, text='Комментарий')
+            else:
+                list(Comment.objects.filter(post_id=post_id).order_by(
+                    '-created', '-id')[:20])
+            done += 1
+        except OperationalError:
+            errors += 1
+    connection.close()
+    results.put((kind, done, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузка на файл SQLite несколькими процессами-писателями и '
+        'читателями: настройки SQLite по умолчанию против SQLITE_PRAGMAS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+
+    def prepare(self, path):
+        connection.close()
+        connection.settings_dict['NAME'] = path
+        call_command('migrate', verbosity=0)
+        user = User.objects.create_user(username='bench')
+        post = Post.objects.create(author=user, text='Популярный пост')
+        connection.close()
+        return post.pk, user.pk
+
+    def run(self, post_id, user_id, options):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        kinds = (['writer'] * options['writers']
+                 + ['reader'] * options['readers'])
+        processes = [
+            context.Process(target=worker, args=(
+                kind, options['seconds'], post_id, user_id, results))
+            for kind in kinds
+        ]
+        for process in processes:
+            process.start()
+        stats = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        totals = {}
+        for kind, done, errors in stats:
+            total = totals.setdefault(kind, [0, 0])
+            total[0] += done
+            total[1] += errors
+        return totals
+
+    def handle(self, *args, **options):
+        modes = (('по умолчанию', {}), ('PRAGMA', settings.SQLITE_PRAGMAS))
+        name = connection.settings_dict['NAME']
+        with tempfile.TemporaryDirectory() as directory:
+            for i, (mode, pragmas) in enumerate(modes):
+                # Режим WAL хранится в файле: у каждого режима своя база
+                path = os.path.join(directory, f'bench_{i}.sqlite3')
+                with override_settings(SQLITE_PRAGMAS=pragmas):
+                    post_id, user_id = self.prepare(path)
+                    totals = self.run(post_id, user_id, options)
+                for kind, (done, errors) in sorted(totals.items()):
+                    self.stdout.write(
+                        f'{mode:>12}: {kind:>6} '
+                        f"{done / options['seconds']:.0f} запросов/с, "
+                        f'ошибок блокировки {errors}')
+        connection.settings_dict['NAME'] = name
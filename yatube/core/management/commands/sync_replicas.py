@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replicas import copy_primary
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в реплики из DATABASE_REPLICAS: '
+        'заменитель репликации для разработки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять раз в столько секунд; 0 - скопировать один раз.')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены: YATUBE_DB_REPLICAS')
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                copy_primary(alias)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(
+            f'Скопировано в {", ".join(settings.DATABASE_REPLICAS)}')
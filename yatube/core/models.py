@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, router, transaction
 
 
 class CreatedModel(models.Model):
@@ -11,3 +11,17 @@ class CreatedModel(models.Model):
     class Meta:
         # Это абстрактная модель:
         abstract = True
+
+
+class AtomicSaveModel(models.Model):
+    """Абстрактная модель. Сохраняет запись и обработчики post_save
+    в одной транзакции: счётчики не расходятся с данными при сбое."""
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
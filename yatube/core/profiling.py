@@ -0,0 +1,185 @@
+"""Профилирование запросов: время SQL, шаблонов и кеша.
+
+ProfilingMiddleware включается настройкой PROFILING_ENABLED и для доли
+запросов PROFILING_SAMPLE_RATE записывает:
+
+* полное время обработки;
+* число SQL-запросов, их суммарное время и повторы одинаковых запросов;
+* время рендера шаблонов (только внешних, без вложенных include);
+* попадания и промахи кеша и время обращений к нему.
+
+Итог отдаётся заголовком Server-Timing и строкой JSON в логгер
+core.profiling. Запросы вне выборки стоят один вызов random(): счётчики
+шаблонов и кеша проверяют только thread-local и сразу выходят.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class Profile:
+    """Счётчики одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_time = 0.0
+        self.queries = Counter()
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.in_cache = False
+
+    @property
+    def duplicates(self):
+        """Сколько запросов повторили уже выполненный с теми же параметрами."""
+        return sum(count - 1 for count in self.queries.values())
+
+    def execute(self, execute, sql, params, many, context):
+        """execute_wrapper соединения с базой."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries[(sql, repr(params))] += 1
+
+    def summary(self, request, response):
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'total_ms': _ms(time.perf_counter() - self.started),
+            'sql_count': sum(self.queries.values()),
+            'sql_ms': _ms(self.sql_time),
+            'sql_duplicates': self.duplicates,
+            'template_ms': _ms(self.template_time),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_ms': _ms(self.cache_time),
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def current():
+    """Профиль текущего запроса или None, если запрос не в выборке."""
+    return getattr(_local, 'profile', None)
+
+
+def server_timing(data):
+    return ', '.join([
+        f"total;dur={data['total_ms']}",
+        f"sql;dur={data['sql_ms']};desc=\"{data['sql_count']} queries, "
+        f"{data['sql_duplicates']} duplicated\"",
+        f"template;dur={data['template_ms']}",
+        f"cache;dur={data['cache_ms']};desc=\"{data['cache_hits']} hits, "
+        f"{data['cache_misses']} misses\"",
+    ])
+
+
+def _profiled_render(render):
+    def wrapper(self, *args, **kwargs):
+        profile = current()
+        if profile is None:
+            return render(self, *args, **kwargs)
+        profile.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_time += time.perf_counter() - started
+    wrapper.profiled = True
+    return wrapper
+
+
+def _profiled_cache(method, count):
+    def wrapper(self, *args, **kwargs):
+        profile = current()
+        # get_many базового класса сам вызывает get: считаем только
+        # внешний вызов.
+        if profile is None or profile.in_cache:
+            return method(self, *args, **kwargs)
+        profile.in_cache = True
+        started = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            profile.in_cache = False
+            profile.cache_time += time.perf_counter() - started
+        hits, misses = count(result, *args, **kwargs)
+        profile.cache_hits += hits
+        profile.cache_misses += misses
+        return result
+    wrapper.profiled = True
+    return wrapper
+
+
+def _count_get(result, key, default=None, version=None):
+    return (0, 1) if result is default else (1, 0)
+
+
+def _count_get_many(result, keys, version=None):
+    hits = len(result)
+    return hits, len(keys) - hits
+
+
+def instrument():
+    """Оборачивает рендер шаблонов и чтение кешей. Повторно не оборачивает."""
+    if not getattr(Template.render, 'profiled', False):
+        Template.render = _profiled_render(Template.render)
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        for name, count in (('get', _count_get),
+                            ('get_many', _count_get_many)):
+            method = getattr(backend, name)
+            if not getattr(method, 'profiled', False):
+                setattr(backend, name, _profiled_cache(method, count))
+
+
+class ProfilingMiddleware:
+    """Записывает профиль выборки запросов (см. описание модуля)."""
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        instrument()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        profile = _local.profile = Profile()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profile.execute))
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+        data = profile.summary(request, response)
+        response['Server-Timing'] = server_timing(data)
+        logger.info(json.dumps(data, ensure_ascii=False), extra=data)
+        return response
@@ -0,0 +1,127 @@
+"""Чтение лент с реплик базы данных.
+
+Реплики перечислены в настройке DATABASE_REPLICAS (алиасы из
+DATABASES). ReplicaRouter пишет всегда в основную базу, а читает с
+реплики только внутри view, обёрнутых в read_replica(): остальной код,
+формы и админка работают с основной базой, как раньше.
+
+Реплика отстаёт от основной базы, поэтому запрос читает с основной:
+
+* если это не GET/HEAD;
+* если его клиент сам писал последние REPLICA_PIN_SECONDS секунд:
+  ReplicaPinMiddleware после каждого изменяющего запроса ставит cookie
+  primary_until, и автор сразу видит свой пост или комментарий;
+* если recent() view сообщает, что в её данные недавно писали: иначе
+  страница, собранная со старой реплики, попала бы в кеш под новым
+  поколением (см. posts/caching.py) и осталась бы устаревшей для всех.
+
+REPLICA_PIN_SECONDS должно быть больше задержки репликации.
+"""
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_local = threading.local()
+
+
+class ReplicaRouter:
+    """Читает с реплики, выбранной read_replica(), пишет в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        return getattr(_local, 'replica', None)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в основной базе
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def pinned(request):
+    """Писал ли клиент в последние REPLICA_PIN_SECONDS секунд."""
+    try:
+        until = float(request.COOKIES.get(PIN_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > time.time()
+
+
+def choose_replica(request):
+    """Алиас реплики для запроса или None, если читать с основной."""
+    if not settings.DATABASE_REPLICAS:
+        return None
+    if request.method not in SAFE_METHODS or pinned(request):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def read_replica(recent=None):
+    """Выполняет view с чтением с реплики.
+
+    recent получает аргументы view и возвращает True, если в данные
+    ответа писали так недавно, что реплика могла их ещё не получить.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            alias = choose_replica(request)
+            if alias is not None and recent is not None and recent(
+                    request, *args, **kwargs):
+                alias = None
+            if alias is None:
+                return view(request, *args, **kwargs)
+            # request.user - ленивый объект: сессия и пользователь
+            # читаются при первом обращении к нему. Обращаемся сейчас,
+            # пока запросы идут в основную базу: только что вошедшего
+            # пользователя на реплике может ещё не быть.
+            if hasattr(request, 'user'):
+                _ = request.user.pk
+            _local.replica = alias
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _local.replica = None
+        return wrapper
+    return decorator
+
+
+class ReplicaPinMiddleware:
+    """Читает с основной базы для клиента, который только что писал."""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            until = time.time() + settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                PIN_COOKIE, f'{until:.3f}',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+        return response
+
+
+def copy_primary(alias):
+    """Копирует основную базу SQLite в реплику alias.
+
+    Заменитель репликации для разработки и тестов: online backup API
+    SQLite переносит снимок базы целиком, не останавливая запись.
+    """
+    primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+    primary.ensure_connection()
+    replica.ensure_connection()
+    primary.connection.backup(replica.connection)
@@ -0,0 +1,38 @@
+"""Настройка соединений с SQLite при открытии.
+
+Настройки Django по умолчанию оставляют SQLite в режиме журнала отката:
+пишущая транзакция блокирует и читателей, и воркеры gunicorn получают
+"database is locked". Обработчик сигнала connection_created выполняет
+PRAGMA из настройки SQLITE_PRAGMAS для каждого нового соединения:
+
+* journal_mode=WAL - читатели не ждут писателя, писатель не ждёт
+  читателей. Режим хранится в файле базы, но повторный PRAGMA дешёвый.
+* synchronous=NORMAL - в режиме WAL fsync только при чекпоинте: после
+  сбоя питания теряются последние транзакции, но база цела.
+* busy_timeout - сколько миллисекунд ждать блокировку, а не падать сразу.
+* mmap_size, cache_size, temp_store - чтение через отображение файла в
+  память, кеш страниц соединения и временные таблицы в памяти.
+
+Базы в памяти (тестовые) WAL не поддерживают: SQLite молча оставляет
+для них режим memory.
+"""
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Выполняет SQLITE_PRAGMAS на новом соединении с SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def read_pragmas(connection, names):
+    """Текущие значения PRAGMA соединения: {имя: значение}."""
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
@@ -0,0 +1,211 @@
+"""Статика с хешем содержимого в имени и долгим кешированием.
+
+collectstatic с хранилищем CompressedManifestStaticFilesStorage кладёт в
+STATIC_ROOT копии файлов с хешем содержимого в имени (css/main.1a2b3c.css)
+и манифест staticfiles.json, по которому {% static %} подставляет эти
+имена. Рядом с текстовыми файлами сразу пишутся сжатые копии .gz и, если
+установлен пакет brotli, .br: при отдаче сжимать ничего не нужно.
+
+StaticFilesApplication отдаёт STATIC_ROOT прямо из WSGI, не доходя до
+Django. Файл с хешем в имени никогда не меняется, поэтому кешируется
+браузером на год с immutable и не перепроверяется при каждом просмотре
+страницы. Файлы без хеша кешируются на STATIC_MAX_AGE секунд.
+
+Без collectstatic (разработка, тесты) манифеста нет, и {% static %}
+возвращает обычные имена.
+"""
+import gzip
+import mimetypes
+import os
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.utils.http import http_date, quote_etag
+
+try:
+    import brotli
+except ImportError:  # без brotli пишутся только копии .gz
+    brotli = None
+
+COMPRESSIBLE = (
+    '.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.xml', '.ico',
+)
+# Сжатая копия, которая экономит меньше 5%, не пишется
+MIN_RATIO = 0.95
+# Кодировки в порядке предпочтения: (Content-Encoding, суффикс файла)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+
+
+def compress(data):
+    """{суффикс: сжатые байты} для копий, которые стоит хранить."""
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data)
+    return {
+        suffix: packed for suffix, packed in variants.items()
+        if len(packed) < len(data) * MIN_RATIO
+    }
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, который пишет сжатые копии файлов."""
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        # Файла нет в манифесте: collectstatic не запускался или файл
+        # добавлен после. Хешировать его на каждый рендер не нужно.
+        clean_name = urlsplit(unquote(name)).path.strip()
+        if self.hash_key(clean_name) not in self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            with self.open(name) as original:
+                variants = compress(original.read())
+            for suffix, packed in variants.items():
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(packed))
+                yield name, name + suffix, True
+
+
+def _accepted(header):
+    """Кодировки из Accept-Encoding, кроме явно запрещённых q=0."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        name, _, quality = params.partition('=')
+        try:
+            if name.strip() == 'q' and float(quality) == 0:
+                continue
+        except ValueError:
+            pass
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFile:
+    """Файл STATIC_ROOT и его сжатые копии."""
+
+    def __init__(self, path, immutable, max_age):
+        stat = os.stat(path)
+        self.path = path
+        self.content_type = (
+            mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        self.cache_control = (
+            IMMUTABLE if immutable else f'public, max-age={max_age}')
+        self.last_modified = http_date(stat.st_mtime)
+        self.version = f'{stat.st_size:x}-{int(stat.st_mtime):x}'
+        self.variants = [
+            (encoding, path + suffix, os.path.getsize(path + suffix))
+            for encoding, suffix in ENCODINGS
+            if os.path.exists(path + suffix)
+        ]
+        self.size = stat.st_size
+
+    def choose(self, accept_encoding):
+        """(Content-Encoding или None, путь, размер) для клиента."""
+        accepted = _accepted(accept_encoding)
+        for encoding, path, size in self.variants:
+            if encoding in accepted:
+                return encoding, path, size
+        return None, self.path, self.size
+
+
+class StaticFilesApplication:
+    """WSGI-обёртка, которая отдаёт статику из STATIC_ROOT сама.
+
+    Файлы и манифест читаются один раз при запуске: после collectstatic
+    воркеры нужно перезапустить, как и после смены кода. Остальные
+    запросы, в том числе к неизвестной статике, уходят в application.
+    """
+
+    def __init__(self, application, root, prefix, max_age):
+        self.application = application
+        self.prefix = prefix
+        self.files = self._scan(root, max_age)
+
+    @staticmethod
+    def _scan(root, max_age):
+        storage = CompressedManifestStaticFilesStorage(location=root)
+        immutable = set(storage.load_manifest().values())
+        suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        files = {}
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(suffixes):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                files[name] = StaticFile(path, name in immutable, max_age)
+        return files
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if (environ['REQUEST_METHOD'] not in ('GET', 'HEAD')
+                or not path.startswith(self.prefix)):
+            return self.application(environ, start_response)
+        static = self.files.get(path[len(self.prefix):])
+        if static is None:
+            return self.application(environ, start_response)
+        return self.serve(static, environ, start_response)
+
+    def serve(self, static, environ, start_response):
+        encoding, path, size = static.choose(
+            environ.get('HTTP_ACCEPT_ENCODING', ''))
+        # У каждой кодировки свои байты, а значит, и свой ETag
+        etag = quote_etag(
+            f'{static.version}-{encoding}' if encoding else static.version)
+        headers = [
+            ('Cache-Control', static.cache_control),
+            ('Last-Modified', static.last_modified),
+            ('ETag', etag),
+        ]
+        if static.variants:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if etag in environ.get('HTTP_IF_NONE_MATCH', ''):
+            start_response('304 Not Modified', headers)
+            return []
+        headers += [
+            ('Content-Type', static.content_type),
+            ('Content-Length', str(size)),
+        ]
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        file = open(path, 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            return file_wrapper(file, CHUNK_SIZE)
+        return _chunks(file)
+
+
+def _chunks(file):
+    with file:
+        yield from iter(lambda: file.read(CHUNK_SIZE), b'')
+
+
+def wrap(application):
+    """Добавляет отдачу статики к WSGI-приложению, если DEBUG выключен.
+
+    В режиме DEBUG статику из исходных каталогов отдаёт runserver.
+    """
+    if settings.DEBUG or not settings.STATIC_ROOT:
+        return application
+    return StaticFilesApplication(
+        application, settings.STATIC_ROOT, settings.STATIC_URL,
+        settings.STATIC_MAX_AGE)
@@ -0,0 +1,419 @@
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.template import Context, Template
+from django.test import (Client, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from .asgi import ASGIHandler, build_environ, call_wsgi
+from .cache import SQLiteCache
+from .profiling import Profile
+from .replicas import PIN_COOKIE, ReplicaRouter, copy_primary
+from .sqlite import read_pragmas
+from .staticfiles import StaticFilesApplication
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    """Проверка кеша в файле SQLite."""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_EVERY': 1}
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        """Запись, чтение, add, incr и удаление."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expired_entries_are_missing(self):
+        """Запись с истёкшим сроком не читается и заменяется через add."""
+        self.cache.set('key', 'value', -1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+
+    def test_shared_between_instances(self):
+        """Два экземпляра на одном файле видят записи друг друга."""
+        other = SQLiteCache(self.location, {})
+        self.cache.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+
+    def test_least_recently_used_are_culled(self):
+        """При переполнении вытесняются давно не читанные записи."""
+        self.cache._touch_interval = 0
+        self.cache.set('hot', 'value')
+        for i in range(12):
+            self.cache.get('hot')
+            self.cache.set(f'cold_{i}', 'value')
+        self.assertEqual(self.cache.get('hot'), 'value')
+        self.assertIsNone(self.cache.get('cold_0'))
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1)
+class ProfilingMiddlewareTest(TestCase):
+    """Профиль запроса в заголовке Server-Timing и в логе."""
+    def test_profile_is_recorded(self):
+        cache.clear()
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            response = Client().get(reverse('posts:index'))
+        data = json.loads(logs.records[0].getMessage())
+        self.assertEqual(data['path'], reverse('posts:index'))
+        self.assertGreater(data['sql_count'], 0)
+        self.assertGreater(data['template_ms'], 0)
+        self.assertGreater(data['cache_misses'], 0)
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertIn(
+            f"desc=\"{data['sql_count']} queries", response['Server-Timing'])
+
+    def test_cached_page_hits_cache(self):
+        cache.clear()
+        with self.assertLogs('core.profiling', 'INFO'):
+            Client().get(reverse('posts:index'))
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            Client().get(reverse('posts:index'))
+        data = json.loads(logs.records[0].getMessage())
+        self.assertGreater(data['cache_hits'], 0)
+
+    def test_duplicated_queries(self):
+        profile = Profile()
+        with connection.execute_wrapper(profile.execute):
+            for _ in range(3):
+                list(User.objects.filter(username='author'))
+            list(User.objects.filter(username='other'))
+        self.assertEqual(sum(profile.queries.values()), 4)
+        self.assertEqual(profile.duplicates, 2)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_request(self):
+        response = Client().get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class SQLitePragmasTest(SimpleTestCase):
+    """PRAGMA из SQLITE_PRAGMAS выполняются на каждом соединении."""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def open(self):
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(self.directory, 'db.sqlite3'),
+        })
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pragmas_applied(self):
+        values = read_pragmas(self.open(), [
+            'journal_mode', 'synchronous', 'busy_timeout', 'cache_size',
+            'temp_store', 'mmap_size'])
+        self.assertEqual(values, {
+            'journal_mode': 'wal',
+            'synchronous': 1,
+            'busy_timeout': settings.SQLITE_PRAGMAS['busy_timeout'],
+            'cache_size': -20000,
+            'temp_store': 2,
+            'mmap_size': settings.SQLITE_PRAGMAS['mmap_size'],
+        })
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234})
+    def test_pragmas_from_settings(self):
+        values = read_pragmas(self.open(), ['journal_mode', 'busy_timeout'])
+        self.assertEqual(values, {'journal_mode': 'delete',
+                                  'busy_timeout': 1234})
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TransactionTestCase):
+    """Ленты читаются с реплики, запись и свежие данные - с основной базы.
+
+    Реплика - отдельный файл SQLite, copy_primary() заменяет репликацию.
+    """
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        connections.databases['replica'] = {
+            **connection.settings_dict,
+            'NAME': os.path.join(directory, 'replica.sqlite3'),
+        }
+        self.addCleanup(self.drop_replica)
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        Post.objects.create(author=self.author, text='Старый пост')
+        copy_primary('replica')
+        self.fresh = Post.objects.create(author=self.author, text='Новый пост')
+        # Отметки о недавней записи живут в кеше
+        cache.clear()
+
+    def drop_replica(self):
+        connections['replica'].close()
+        del connections.databases['replica']
+        del connections._connections.replica
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+
+    def test_feed_read_from_replica(self):
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'Старый пост')
+        self.assertNotContains(response, 'Новый пост')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_writer_pinned_to_primary(self):
+        client = Client()
+        client.force_login(User.objects.create_user(username='reader'))
+        cache.clear()
+        response = client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.fresh.pk}),
+            {'text': 'Комментарий'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(Comment.objects.using('default').count(), 1)
+        self.assertEqual(Comment.objects.using('replica').count(), 0)
+        cache.clear()
+        response = client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+
+    def test_recently_written_data_read_from_primary(self):
+        """Страницу, в данные которой только что писали, читаем с основной."""
+        Post.objects.create(author=self.author, text='Свежий пост')
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
+
+    def test_replication_catches_up(self):
+        copy_primary('replica')
+        response = Client().get(reverse(
+            'posts:profile', kwargs={'username': 'author'}))
+        self.assertContains(response, 'Новый пост')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+
+
+def asgi_request(application, method, path, query=b'', body=b'',
+                 headers=()):
+    """Прогоняет один HTTP-запрос через ASGI-приложение."""
+    scope = {
+        'type': 'http', 'method': method, 'path': path,
+        'query_string': query, 'headers': list(headers),
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 5000),
+    }
+    messages = [
+        {'type': 'http.request', 'body': body[:1], 'more_body': True},
+        {'type': 'http.request', 'body': body[1:]},
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    start, response = sent
+    return start['status'], dict(start['headers']), response['body']
+
+
+class ASGIHandlerTest(TransactionTestCase):
+    """ASGI-вход отдаёт те же ответы, что и WSGI."""
+    def setUp(self):
+        cache.clear()
+        self.application = ASGIHandler(
+            get_wsgi_application(), threads=2, max_pending=10)
+        self.addCleanup(self.application.executor.shutdown)
+        author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=author, text='Пост по ASGI')
+
+    def test_get(self):
+        status, headers, body = asgi_request(
+            self.application, 'GET', '/')
+        self.assertEqual(status, 200)
+        self.assertIn(b'text/html', headers[b'content-type'])
+        self.assertIn('Пост по ASGI'.encode(), body)
+
+    def test_query_string(self):
+        status, _, body = asgi_request(
+            self.application, 'GET', '/search/',
+            query='q=ASGI'.encode())
+        self.assertEqual(status, 200)
+        self.assertIn('Пост по ASGI'.encode(), body)
+
+    def test_body_read_in_chunks(self):
+        messages = [
+            {'type': 'http.request', 'body': b'text=', 'more_body': True},
+            {'type': 'http.request', 'body': b'value'},
+        ]
+
+        async def receive():
+            return messages.pop(0)
+
+        body = asyncio.run(self.application.read_body(receive))
+        self.assertEqual(body, b'text=value')
+
+    def test_overload(self):
+        self.application.max_pending = 0
+        status, headers, _ = asgi_request(self.application, 'GET', '/')
+        self.assertEqual(status, 503)
+        self.assertEqual(headers[b'retry-after'], b'1')
+
+    def test_environ(self):
+        environ = build_environ({
+            'method': 'GET', 'path': '/группа/', 'query_string': b'a=1',
+            'headers': [(b'x-tag', b'a'), (b'x-tag', b'b'),
+                        (b'content-type', b'text/plain')],
+        }, b'text=value')
+        self.assertEqual(environ['wsgi.input'].read(), b'text=value')
+        self.assertEqual(environ['PATH_INFO'].encode('latin-1').decode(),
+                         '/группа/')
+        self.assertEqual(environ['HTTP_X_TAG'], 'a,b')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['QUERY_STRING'], 'a=1')
+
+    def test_repeated_cookie_headers(self):
+        """Два заголовка Cookie дают две куки, а не одну склеенную."""
+        environ = build_environ({
+            'method': 'GET', 'path': '/',
+            'headers': [(b'cookie', b'sessionid=abc'),
+                        (b'cookie', b'csrftoken=xyz')],
+        }, b'')
+        self.assertEqual(
+            environ['HTTP_COOKIE'], 'sessionid=abc; csrftoken=xyz')
+        request = WSGIRequest(environ)
+        self.assertEqual(request.COOKIES, {
+            'sessionid': 'abc', 'csrftoken': 'xyz'})
+
+
+STYLES = 'body { background: url("../img/logo.png"); }\n' + (
+    '.post { margin: 0 auto; padding: 1rem; }\n' * 50)
+
+
+class StaticFilesTest(SimpleTestCase):
+    """collectstatic пишет файлы с хешем и сжатые копии, WSGI их отдаёт."""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        source = os.path.join(self.directory, 'source')
+        self.root = os.path.join(self.directory, 'root')
+        os.makedirs(os.path.join(source, 'css'))
+        os.makedirs(os.path.join(source, 'img'))
+        with open(os.path.join(source, 'css', 'site.css'), 'w') as css:
+            css.write(STYLES)
+        with open(os.path.join(source, 'img', 'logo.png'), 'wb') as logo:
+            logo.write(b'\x89PNG' + os.urandom(64))
+        settings_override = override_settings(
+            STATICFILES_DIRS=[source], STATIC_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def collect(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.css = staticfiles_storage.stored_name('css/site.css')
+
+        def django(environ, start_response):
+            start_response('404 Not Found', [])
+            return [b'django']
+
+        self.application = StaticFilesApplication(
+            django, self.root, '/static/', 60)
+
+    def get(self, path, method='GET', **headers):
+        return call_wsgi(self.application, build_environ({
+            'method': method, 'path': path,
+            'headers': [(name.replace('_', '-').encode(), value.encode())
+                        for name, value in headers.items()],
+        }, b''))
+
+    def test_without_manifest_names_are_plain(self):
+        rendered = Template(
+            "{% load static %}{% static 'css/site.css' %}").render(Context())
+        self.assertEqual(rendered, '/static/css/site.css')
+
+    def test_collectstatic(self):
+        self.collect()
+        self.assertRegex(self.css, r'^css/site\.[0-9a-f]{12}\.css$')
+        rendered = Template(
+            "{% load static %}{% static 'css/site.css' %}").render(Context())
+        self.assertEqual(rendered, f'/static/{self.css}')
+        with open(os.path.join(self.root, self.css), 'rb') as css:
+            content = css.read()
+        logo = staticfiles_storage.stored_name('img/logo.png')
+        self.assertIn(f'../{logo}'.encode(), content)
+        with open(os.path.join(self.root, self.css + '.gz'), 'rb') as packed:
+            self.assertEqual(gzip.decompress(packed.read()), content)
+        self.assertFalse(os.path.exists(os.path.join(
+            self.root, logo + '.gz')))
+
+    def test_hashed_file_is_immutable(self):
+        self.collect()
+        status, headers, body = self.get(
+            f'/static/{self.css}', accept_encoding='gzip, deflate')
+        headers = dict(headers)
+        self.assertEqual(status, 200)
+        self.assertIn(b'immutable', headers[b'cache-control'])
+        self.assertEqual(headers[b'content-encoding'], b'gzip')
+        self.assertEqual(headers[b'vary'], b'Accept-Encoding')
+        self.assertEqual(headers[b'content-type'], b'text/css')
+        self.assertIn(b'.post', gzip.decompress(body))
+        status, _, body = self.get(
+            f'/static/{self.css}', if_none_match=headers[b'etag'].decode(),
+            accept_encoding='gzip')
+        self.assertEqual((status, body), (304, b''))
+
+    def test_plain_file_is_revalidated(self):
+        self.collect()
+        status, headers, body = self.get(
+            '/static/css/site.css', accept_encoding='gzip;q=0')
+        headers = dict(headers)
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'cache-control'], b'public, max-age=60')
+        self.assertNotIn(b'content-encoding', headers)
+        self.assertEqual(body.decode(), STYLES)
+        _, _, body = self.get('/static/css/site.css', method='HEAD')
+        self.assertEqual(body, b'')
+
+    def test_other_requests_reach_django(self):
+        self.collect()
+        for method, path in (('GET', '/static/missing.css'),
+                             ('POST', f'/static/{self.css}'),
+                             ('GET', '/')):
+            self.assertEqual(
+                self.get(path, method=method), (404, [], b'django'))
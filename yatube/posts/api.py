@@ -0,0 +1,121 @@
+"""JSON-версии лент постов.
+
+Ответы собираются из values() тех же queryset, что и у HTML-страниц,
+без моделей, форм и шаблонов. Страницы листаются курсором ?cursor=,
+клиент, который опрашивает ленту, получает 304 по ETag (см.
+conditional.py).
+"""
+from functools import wraps
+
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+
+from posts import conditional
+from posts.models import Group, Post, User
+from posts.storage import post_images
+from posts.timeline import TimelinePaginator
+from posts.utils import NUMBER_OF_POSTS, KeysetPaginator, get_comments
+
+POST_FIELDS = (
+    'pk', 'text', 'created', 'updated', 'author__username', 'group__slug',
+    'image', 'image_width', 'image_height',
+)
+
+
+def serialize_post(row):
+    return {
+        'id': row['pk'],
+        'text': row['text'],
+        'created': row['created'],
+        'updated': row['updated'],
+        'author': row['author__username'],
+        'group': row['group__slug'],
+        'image': post_images.url(row['image']) if row['image'] else None,
+        'image_width': row['image_width'],
+        'image_height': row['image_height'],
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created,
+    }
+
+
+def feed_response(request, posts):
+    paginator = KeysetPaginator(posts.values(*POST_FIELDS), NUMBER_OF_POSTS)
+    return page_response(request, paginator)
+
+
+def page_response(request, paginator):
+    page = paginator.get_cursor_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [serialize_post(row) for row in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def login_required_json(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Требуется вход.'}, status=401,
+                json_dumps_params={'ensure_ascii': False})
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@conditional.conditional(conditional.index_posts)
+def index(request):
+    """Главная лента."""
+    return feed_response(request, Post.objects.all())
+
+
+@conditional.conditional(conditional.group_posts)
+def group_posts(request, slug):
+    """Лента группы."""
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return feed_response(request, group.posts.all())
+
+
+@conditional.conditional(conditional.profile_posts)
+def profile(request, username):
+    """Посты автора."""
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return feed_response(request, author.posts.all())
+
+
+@conditional.conditional(conditional.post_posts)
+def post_detail(request, post_id):
+    """Пост с первой порцией комментариев."""
+    row = Post.objects.filter(pk=post_id).values(*POST_FIELDS).first()
+    if row is None:
+        raise Http404
+    post = serialize_post(row)
+    comments, post['comments_next_cursor'] = get_comments(post_id)
+    post['comments'] = [serialize_comment(comment) for comment in comments]
+    return JsonResponse(post, json_dumps_params={'ensure_ascii': False})
+
+
+@conditional.conditional(conditional.post_posts)
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments, next_cursor = get_comments(post_id, request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [serialize_comment(comment) for comment in comments],
+        'next_cursor': next_cursor,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@login_required_json
+@conditional.conditional(conditional.follow_posts, per_user=True)
+def follow_index(request):
+    """Лента подписок."""
+    return page_response(request, TimelinePaginator(
+        request.user, Post.objects.values(*POST_FIELDS), NUMBER_OF_POSTS))
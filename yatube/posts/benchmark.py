@@ -0,0 +1,211 @@
+"""Нагрузочный замер страниц постов на больших сгенерированных данных.
+
+seed() наполняет пустую базу пользователями, группами, постами,
+подписками и комментариями через bulk_create. Данные детерминированы
+параметром seed, поэтому замеры разных коммитов сравнимы. Сигналы при
+bulk_create не срабатывают: счётчики и поисковый индекс пересчитываются
+в конце, а посты остаются не разложенными по таймлайнам (fanned_out =
+False), и лента подписок собирается из постов авторов, как для авторов
+с большим числом подписчиков.
+
+measure() прогоняет страницы через тестовый клиент и собирает
+перцентили времени ответа, число SQL-запросов и пик памяти на запрос.
+"""
+import math
+import random
+import resource
+import time
+import tracemalloc
+from itertools import accumulate, islice
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import search
+from posts.counters import recount_all
+from posts.models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 5000
+START = '2022-01-01'
+# Посты идут раз в 30 секунд, комментарии - в пределах суток после поста
+POST_STEP = 30 / 86400
+COMMENT_SPREAD = 86400
+WORDS = (
+    'утро вечер город река лес дорога дом окно книга письмо друг встреча '
+    'музыка кино погода дождь солнце снег море поезд работа отпуск кофе '
+    'чай ужин рецепт прогулка парк собака кошка сад цветы фото новости '
+    'проект код тест релиз ошибка идея план неделя выходные праздник'
+).split()
+
+
+def _chunks(objects, size=BATCH_SIZE):
+    objects = iter(objects)
+    while True:
+        chunk = list(islice(objects, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _bulk_create(model, objects):
+    for chunk in _chunks(objects):
+        model.objects.bulk_create(chunk)
+
+
+def _popular(rng, ids, k):
+    """k случайных id с перекосом в сторону первых: авторы по Ципфу."""
+    cum_weights = list(accumulate(
+        1 / rank for rank in range(1, len(ids) + 1)))
+    while k > 0:
+        size = min(k, BATCH_SIZE)
+        yield from rng.choices(ids, cum_weights=cum_weights, k=size)
+        k -= size
+
+
+def _follows(rng, user_ids, count):
+    """Поровну подписок на пользователя, на самых популярных авторов."""
+    per_user = min(count // max(len(user_ids), 1), len(user_ids) - 1)
+    authors = user_ids[:max(len(user_ids) // 10, per_user + 1)]
+    for user_id in user_ids:
+        chosen = set()
+        while len(chosen) < per_user:
+            author_id = rng.choice(authors)
+            if author_id != user_id:
+                chosen.add(author_id)
+        for author_id in chosen:
+            yield Follow(user_id=user_id, author_id=author_id)
+
+
+def seed(users=1000, groups=20, posts=10000, follows=20000, comments=20000,
+         seed=0):
+    """Наполняет базу данными. Возвращает количество созданных строк."""
+    rng = random.Random(seed)
+    with transaction.atomic():
+        _bulk_create(User, (
+            User(username=f'bench_{i}', password='!')
+            for i in range(users)))
+        _bulk_create(Group, (
+            Group(title=f'Группа {i}', slug=f'bench-{i}',
+                  description=f'Описание группы {i}')
+            for i in range(groups)))
+        user_ids = list(User.objects.filter(
+            username__startswith='bench_').values_list('pk', flat=True))
+        group_ids = list(Group.objects.filter(
+            slug__startswith='bench-').values_list('pk', flat=True))
+        # Четверть постов без группы
+        group_choices = group_ids + [None] * (len(group_ids) // 3)
+        _bulk_create(Post, (
+            Post(author_id=author_id, text=f'Пост {i} ' + ' '.join(
+                rng.choices(WORDS, k=rng.randint(5, 40))),
+                group_id=rng.choice(group_choices) if group_ids else None)
+            for i, author_id in enumerate(_popular(rng, user_ids, posts))))
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        _bulk_create(Follow, _follows(rng, user_ids, follows))
+        if post_ids:
+            _bulk_create(Comment, (
+                Comment(post_id=rng.choice(post_ids),
+                        author_id=rng.choice(user_ids),
+                        text=' '.join(rng.choices(WORDS, k=8)))
+                for _ in range(comments)))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE posts_post SET created = strftime('
+                "'%%Y-%%m-%%d %%H:%%M:%%f', julianday(%s) + id * %s)",
+                [START, POST_STEP])
+            cursor.execute('UPDATE posts_post SET updated = created')
+            cursor.execute(
+                'UPDATE posts_comment SET created = ('
+                " SELECT strftime('%%Y-%%m-%%d %%H:%%M:%%f',"
+                '  julianday(p.created) + (posts_comment.id %% %s) / 86400.0)'
+                ' FROM posts_post p WHERE p.id = posts_comment.post_id)',
+                [COMMENT_SPREAD])
+        recount_all()
+        search.rebuild()
+    return {
+        'users': User.objects.count(),
+        'groups': Group.objects.count(),
+        'posts': Post.objects.count(),
+        'follows': Follow.objects.count(),
+        'comments': Comment.objects.count(),
+    }
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+
+def _pages(rng):
+    """(имя, нужен ли вход, функция адреса) для каждой страницы."""
+    groups = list(Group.objects.values_list('slug', flat=True))
+    authors = list(
+        Post.objects.values_list('author__username', flat=True).distinct())
+    post_ids = list(Post.objects.values_list('pk', flat=True)[:10000])
+    pages = [('index', False, lambda: reverse('posts:index'))]
+    if groups:
+        pages.append(('group_posts', False, lambda: reverse(
+            'posts:group_list', kwargs={'slug': rng.choice(groups)})))
+    if authors:
+        pages.append(('profile', False, lambda: reverse(
+            'posts:profile', kwargs={'username': rng.choice(authors)})))
+        pages.append(('post_detail', False, lambda: reverse(
+            'posts:post_detail', kwargs={'post_id': rng.choice(post_ids)})))
+    pages.append(('follow_index', True, lambda: reverse(
+        'posts:follow_index')))
+    return pages
+
+
+def measure(requests=200, warm=False, seed=0):
+    """Замеряет страницы. Возвращает {страница: метрики}.
+
+    Без warm кеш очищается перед каждым запросом, и замер показывает
+    работу базы и шаблонов, а не попадания в кеш страниц.
+    """
+    rng = random.Random(seed)
+    reader = Follow.objects.values_list('user', flat=True).first()
+    clients = {
+        False: Client(HTTP_HOST='localhost'),
+        True: Client(HTTP_HOST='localhost'),
+    }
+    if reader is not None:
+        clients[True].force_login(User.objects.get(pk=reader))
+    results = {}
+    for name, login, url in _pages(rng):
+        if login and reader is None:
+            continue
+        client = clients[login]
+        timings = []
+        for _ in range(requests):
+            address = url()
+            if not warm:
+                cache.clear()
+            started = time.perf_counter()
+            response = client.get(address)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(
+                    f'{address}: код ответа {response.status_code}')
+        if not warm:
+            cache.clear()
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = {
+            'requests': requests,
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'queries': len(queries),
+            'peak_kb': round(peak / 1024, 1),
+        }
+    return results
+
+
+def max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
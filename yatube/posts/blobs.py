@@ -0,0 +1,54 @@
+"""Счётчики ссылок постов на файлы картинок.
+
+У каждого файла картинки поста есть строка ImageBlob с числом постов,
+которые на него ссылаются. Одинаковые картинки хранятся одним файлом
+(см. storage.py), поэтому удаление поста не может просто удалить свой
+файл. Счётчики меняются в обработчиках сигналов, в той же транзакции,
+что и пост, и файл с нулём ссылок можно удалять, не сканируя посты.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ImageBlob, Post
+
+
+def _shift(name, refs):
+    # update() не трогает auto_now: дата нужна сборке мусора, чтобы не
+    # удалить файл, который только что снова начали использовать
+    return ImageBlob.objects.filter(name=name).update(
+        refs=refs, updated=timezone.now())
+
+
+def acquire(name):
+    """Добавляет ссылку на файл name."""
+    if not name:
+        return
+    if _shift(name, F('refs') + 1):
+        return
+    try:
+        with transaction.atomic():
+            ImageBlob.objects.create(name=name, refs=1)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос.
+        _shift(name, F('refs') + 1)
+
+
+def release(name):
+    """Убирает ссылку на файл name. Сам файл удаляет сборка мусора."""
+    if name:
+        _shift(name, Greatest(F('refs') - 1, 0))
+
+
+def recount():
+    """Пересчитывает ссылки по постам. Возвращает число файлов."""
+    refs = dict(
+        Post.objects.exclude(image='').values_list('image').annotate(
+            total=Count('pk')).order_by())
+    with transaction.atomic():
+        ImageBlob.objects.exclude(name__in=refs).update(refs=0)
+        for name, total in refs.items():
+            ImageBlob.objects.update_or_create(
+                name=name, defaults={'refs': total})
+    return len(refs)
@@ -0,0 +1,137 @@
+"""Версионированный кеш страниц.
+
+У каждой области данных (лента, группа, профиль, пост) есть счётчик
+поколения в кеше. Ключ закешированной страницы включает текущее
+поколение её области, поэтому запись, которая меняет данные, просто
+увеличивает счётчик, и страница пересобирается при следующем запросе.
+Старые поколения никто больше не читает, они вытесняются по таймауту.
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from django.views.decorators.cache import cache_page
+
+VERSION_KEY = 'cache_version:{}'
+WRITTEN_KEY = 'cache_written:{}'
+
+INDEX = 'posts'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def _fresh_version():
+    # Если счётчик вытеснили из кеша, новое поколение не должно
+    # совпасть ни с одним из старых.
+    return int(time.time() * 1000)
+
+
+def get_version(scope):
+    """Текущее поколение области."""
+    key = VERSION_KEY.format(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+    if settings.DATABASE_REPLICAS:
+        cache.set_many(
+            {WRITTEN_KEY.format(scope): True for scope in scopes},
+            settings.REPLICA_PIN_SECONDS)
+
+
+def bump(*scopes):
+    """Начинает новое поколение для каждой из областей.
+
+    Внутри транзакции поколение меняется ещё раз после коммита. Читатель,
+    который между первой сменой и коммитом видел старый снимок базы,
+    мог закешировать старые данные под новым поколением: второе
+    поколение их больше не читает.
+    """
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def written_recently(scopes_for):
+    """recent() для core.replicas.read_replica по областям ответа.
+
+    scopes_for - функция из conditional.py: получает аргументы view и
+    возвращает области кеша ответа.
+    """
+    def recent(request, *args, **kwargs):
+        scopes = scopes_for(request, *args, **kwargs)
+        return bool(cache.get_many(
+            [WRITTEN_KEY.format(scope) for scope in scopes]))
+    return recent
+
+
+def _shared(view):
+    """view, чей ответ не попадёт в общий кеш, если он личный.
+
+    Ответ кешируется до того, как SessionMiddleware и CsrfViewMiddleware
+    добавят Vary: Cookie, поэтому страницу с CSRF-токеном сессии
+    помечаем private: cache_page такие ответы не сохраняет.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if request.META.get('CSRF_COOKIE_USED'):
+            patch_cache_control(response, private=True)
+        return response
+    return wrapper
+
+
+def cache_versioned(scope_for, variant=None):
+    """Кеширует страницу до смены поколения её области.
+
+    scope_for получает аргументы view и возвращает имя области.
+    variant получает запрос и возвращает строку для ключа, если view
+    по одному адресу отдаёт разные ответы.
+    В кеш попадают только страницы анонимов: у вошедшего пользователя
+    в шапке его имя, на странице - кнопки подписки и форма комментария.
+    Браузеру страница отдаётся без max-age: свежесть решает сервер.
+    """
+    def decorator(view):
+        shared = _shared(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.user.is_authenticated:
+                response = view(request, *args, **kwargs)
+            else:
+                scope = scope_for(*args, **kwargs)
+                key_prefix = f'{view.__name__}:{scope}:{get_version(scope)}'
+                if variant is not None:
+                    key_prefix += f':{variant(request)}'
+                response = cache_page(
+                    settings.POSTS_PAGE_CACHE_TIMEOUT, key_prefix=key_prefix,
+                )(shared)(request, *args, **kwargs)
+            if 'Expires' in response:
+                del response['Expires']
+            patch_cache_control(response, max_age=0, must_revalidate=True)
+            return response
+        return wrapper
+    return decorator
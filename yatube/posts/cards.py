@@ -0,0 +1,108 @@
+"""Кеш отрендеренных карточек постов.
+
+Карточка почти не меняется после публикации, поэтому её HTML хранится
+в кеше под ключом из id поста, даты изменения и всего, что карточка
+показывает об авторе и группе: имени пользователя, полного имени и
+адреса группы. Правка поста меняет updated, переименование автора или
+группы меняет хеш, и карточка просто получает новый ключ.
+
+Попадания и промахи копятся в памяти процесса и раз в
+STATS_FLUSH_INTERVAL секунд добавляются к общим счётчикам в кеше:
+incr на каждый рендер страницы был бы лишней записью в общий кеш.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+CARD_KEY = 'post_card:{}:{}:{}'
+HITS_KEY = 'post_card:hits'
+MISSES_KEY = 'post_card:misses'
+STATS_FLUSH_INTERVAL = 10
+
+_pending = {HITS_KEY: 0, MISSES_KEY: 0}
+_pending_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def card_key(post):
+    author = post.author
+    shown = '\n'.join([
+        author.username, author.first_name, author.last_name,
+        post.group.slug if post.group_id else '',
+    ])
+    return CARD_KEY.format(
+        post.pk, post.updated.timestamp(),
+        hashlib.md5(shown.encode()).hexdigest())
+
+
+def _incr(key, value):
+    if not value:
+        return
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, value)
+
+
+def flush_stats():
+    """Добавляет накопленные в процессе счётчики к общим."""
+    global _flushed_at
+    with _pending_lock:
+        counts = dict(_pending)
+        for key in _pending:
+            _pending[key] = 0
+        _flushed_at = time.monotonic()
+    for key, value in counts.items():
+        _incr(key, value)
+
+
+def _count(hits, misses):
+    with _pending_lock:
+        _pending[HITS_KEY] += hits
+        _pending[MISSES_KEY] += misses
+        due = time.monotonic() - _flushed_at >= STATS_FLUSH_INTERVAL
+    if due:
+        flush_stats()
+
+
+def get_cards(posts):
+    """HTML карточек для списка постов: {ключ: html}.
+
+    Все карточки страницы читаются из кеша одним get_many, недостающие
+    рендерятся и записываются одним set_many.
+    """
+    keys = {card_key(post): post for post in posts}
+    cards = cache.get_many(list(keys))
+    missing = {
+        key: render_to_string(CARD_TEMPLATE, {'post': post})
+        for key, post in keys.items() if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, settings.POSTS_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    _count(len(keys) - len(missing), len(missing))
+    return cards
+
+
+def stats():
+    """Счётчики попаданий и промахов кеша карточек.
+
+    Вместе со счётчиками этого процесса; другие процессы добавляют свои
+    при первом рендере после STATS_FLUSH_INTERVAL секунд.
+    """
+    flush_stats()
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    return values.get(HITS_KEY, 0), values.get(MISSES_KEY, 0)
+
+
+def reset_stats():
+    with _pending_lock:
+        for key in _pending:
+            _pending[key] = 0
+    cache.delete_many([HITS_KEY, MISSES_KEY])
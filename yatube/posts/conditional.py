@@ -0,0 +1,77 @@
+"""Условные GET-запросы: ETag без рендера страницы.
+
+ETag строится из поколений областей кеша (см. caching.py), которые
+меняются при любой записи в их данные: новом посте, правке и удалении.
+Проверка стоит одного чтения кеша. Если ETag клиента совпал, view не
+вызывается и клиент получает 304.
+
+Last-Modified не отдаётся: дата самого нового поста не сдвигается при
+правке или удалении, а время смены поколения точно только до секунды.
+Клиент, приславший только If-Modified-Since, всегда получает страницу.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from posts import caching
+
+
+def validator(request, scopes, per_user=False):
+    """ETag для ответа на request."""
+    parts = [
+        f'{scope}={caching.get_version(scope)}' for scope in scopes]
+    parts.append(request.get_full_path())
+    if per_user:
+        parts.append(str(request.user.pk))
+    return quote_etag(hashlib.md5(':'.join(parts).encode()).hexdigest())
+
+
+def conditional(scopes_for, per_user=False):
+    """Отвечает 304, если ETag клиента ещё действителен.
+
+    scopes_for получает аргументы view и возвращает области кеша, от
+    которых зависит ответ. per_user добавляет пользователя в ETag для
+    страниц, которые от него зависят.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            etag = validator(
+                request, scopes_for(request, *args, **kwargs), per_user)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
+
+
+# Области кеша, от которых зависят ответы лент: аргументы для
+# conditional() у HTML-страниц и у их JSON-версий.
+
+def index_posts(request):
+    return [caching.INDEX]
+
+
+def group_posts(request, slug):
+    return [caching.group_scope(slug)]
+
+
+def profile_posts(request, username):
+    return [caching.profile_scope(username)]
+
+
+def post_posts(request, post_id):
+    return [caching.post_scope(post_id)]
+
+
+def follow_posts(request):
+    # Посты любых авторов меняют поколение главной ленты, подписки
+    # и отписки - поколение профиля читателя.
+    return [caching.INDEX, caching.profile_scope(request.user.username)]
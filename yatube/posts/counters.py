@@ -0,0 +1,136 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными UPDATE с F-выражениями в обработчиках
+сигналов, поэтому попадают в ту же транзакцию, что и запись, которая
+их изменила. Расхождения (bulk_create, ручные правки в базе) чинит
+команда recount_counters.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Comment, Follow, Group, Post, User, UserCounter
+
+BATCH_SIZE = 500
+
+
+def _shift(queryset, deltas):
+    """Сдвигает счётчики в queryset, не опуская их ниже нуля."""
+    return queryset.update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def recount_user(user_id):
+    """Точные значения счётчиков пользователя из базы."""
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def change_user(user_id, **deltas):
+    """Сдвигает счётчики пользователя.
+
+    Если строки счётчиков ещё нет, при увеличении она создаётся
+    с точными значениями, при уменьшении ничего не делается.
+    """
+    if _shift(UserCounter.objects.filter(user_id=user_id), deltas):
+        return
+    if all(delta < 0 for delta in deltas.values()):
+        return
+    try:
+        with transaction.atomic():
+            UserCounter.objects.create(
+                user_id=user_id, **recount_user(user_id))
+    except IntegrityError:
+        # Строку успел создать параллельный запрос.
+        _shift(UserCounter.objects.filter(user_id=user_id), deltas)
+
+
+def change_group(group_id, delta):
+    if group_id is not None:
+        _shift(Group.objects.filter(pk=group_id), {'posts_count': delta})
+
+
+def change_post(post_id, delta):
+    _shift(Post.objects.filter(pk=post_id), {'comments_count': delta})
+
+
+def for_user(user):
+    """Счётчики пользователя; отсутствующая строка создаётся."""
+    try:
+        return user.counter
+    except UserCounter.DoesNotExist:
+        counter, _ = UserCounter.objects.get_or_create(
+            user=user, defaults=recount_user(user.pk))
+        return counter
+
+
+def _grouped(queryset, field):
+    return dict(
+        queryset.values_list(field).annotate(total=Count('pk')).order_by())
+
+
+def recount_all(dry_run=False):
+    """Пересчитывает все счётчики и чинит расхождения.
+
+    Возвращает количество исправленных строк по каждой таблице.
+    """
+    repaired = {'users': 0, 'groups': 0, 'posts': 0}
+
+    posts_by_author = _grouped(Post.objects, 'author')
+    followers = _grouped(Follow.objects, 'author')
+    following = _grouped(Follow.objects, 'user')
+    existing = {
+        counter.user_id: counter
+        for counter in UserCounter.objects.iterator()
+    }
+    to_create, to_update = [], []
+    for user_id in User.objects.values_list('pk', flat=True).iterator():
+        values = {
+            'posts_count': posts_by_author.get(user_id, 0),
+            'followers_count': followers.get(user_id, 0),
+            'following_count': following.get(user_id, 0),
+        }
+        counter = existing.get(user_id)
+        if counter is None:
+            to_create.append(UserCounter(user_id=user_id, **values))
+        elif any(getattr(counter, f) != v for f, v in values.items()):
+            for field, value in values.items():
+                setattr(counter, field, value)
+            to_update.append(counter)
+    repaired['users'] = len(to_create) + len(to_update)
+
+    posts_by_group = _grouped(Post.objects.exclude(group=None), 'group')
+    groups = [
+        Group(pk=pk, posts_count=posts_by_group.get(pk, 0))
+        for pk, count in Group.objects.values_list(
+            'pk', 'posts_count').iterator()
+        if posts_by_group.get(pk, 0) != count
+    ]
+    repaired['groups'] = len(groups)
+
+    comments_by_post = _grouped(Comment.objects, 'post')
+    posts = [
+        Post(pk=pk, comments_count=comments_by_post.get(pk, 0))
+        for pk, count in Post.objects.values_list(
+            'pk', 'comments_count').iterator()
+        if comments_by_post.get(pk, 0) != count
+    ]
+    repaired['posts'] = len(posts)
+
+    if not dry_run:
+        with transaction.atomic():
+            UserCounter.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+            UserCounter.objects.bulk_update(
+                to_update,
+                ['posts_count', 'followers_count', 'following_count'],
+                batch_size=BATCH_SIZE)
+            Group.objects.bulk_update(
+                groups, ['posts_count'], batch_size=BATCH_SIZE)
+            Post.objects.bulk_update(
+                posts, ['comments_count'], batch_size=BATCH_SIZE)
+    return repaired
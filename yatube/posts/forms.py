@@ -1,6 +1,8 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 
+from . import images
 from .models import Comment, Post
 
 
@@ -10,6 +12,18 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image', )
 
+    def clean_image(self):
+        """Новая картинка пересжимается, её размеры пишутся в пост."""
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            processed = images.process(image)
+            image = processed.file
+            self.instance.image_width = processed.width
+            self.instance.image_height = processed.height
+        elif not image:
+            self.instance.image_width = self.instance.image_height = None
+        return image
+
 
 def clean_text(self):
     text = self.cleaned_date['text']
@@ -0,0 +1,94 @@
+"""Материализованные ленты групп.
+
+Для каждой группы в кеше лежат сама группа и ключи (created, id) её
+GROUP_FEED_SIZE новых постов. Страница группы берёт свои id из этого
+списка и читает посты одним запросом по первичному ключу: без поиска
+группы по slug и без сортировки постов группы.
+
+Список хранится под поколением области группы (см. caching.py), а
+поколение меняется при создании, правке и удалении поста группы, при
+переносе поста в другую группу и при правке самой группы. Первый запрос
+нового поколения собирает список заново одним запросом по индексу
+(group, created, id). Список, собранный по снимку базы до коммита
+записи, остаётся под промежуточным поколением: после коммита поколение
+меняется ещё раз, и такой список уже никто не прочитает.
+
+Страницы глубже GROUP_FEED_SIZE постов и старые ссылки ?page=N идут
+обычным запросом к ленте группы.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+
+from posts import caching
+from posts.models import Group
+from posts.utils import (NEXT, NUMBER_OF_POSTS, KeysetPaginator,
+                         decode_cursor, paginate)
+
+FEED_KEY = 'group_feed:{}:{}'
+
+
+def get_feed(slug):
+    """(группа, ключи новых постов, все ли посты группы в ключах)."""
+    size = settings.GROUP_FEED_SIZE
+    key = FEED_KEY.format(slug, caching.get_version(caching.group_scope(slug)))
+    feed = cache.get(key)
+    if feed is None:
+        group = get_object_or_404(Group, slug=slug)
+        keys = list(group.posts.order_by('-created', '-pk').values_list(
+            'created', 'pk')[:size + 1])
+        feed = (group, keys[:size], len(keys) <= size)
+        cache.set(key, feed, settings.POSTS_PAGE_CACHE_TIMEOUT)
+    return feed
+
+
+class MaterializedPaginator(KeysetPaginator):
+    """KeysetPaginator, который берёт ключи страниц из готового списка.
+
+    keys - ключи (created, id) новых записей по убыванию, complete -
+    все ли записи в них попали. Если страница выходит за конец неполного
+    списка, она собирается запросом, как в KeysetPaginator.
+    """
+
+    def __init__(self, object_list, per_page, keys, complete, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.keys = keys
+        self.complete = complete
+
+    def get_cursor_page(self, token):
+        cursor = decode_cursor(token) if token else None
+        anchored = has_previous = cursor is not None
+        start = 0
+        if cursor is not None:
+            direction, created, pk = cursor
+            anchor = (created, pk)
+            if direction == NEXT:
+                start = sum(1 for key in self.keys if key >= anchor)
+            else:
+                newer = sum(1 for key in self.keys if key > anchor)
+                if newer == len(self.keys) and not self.complete:
+                    # Курсор старше списка: сколько постов между ними,
+                    # знает только база
+                    return super().get_cursor_page(token)
+                if newer <= self.per_page:
+                    anchored = has_previous = False
+                else:
+                    start = newer - self.per_page
+        end = start + self.per_page
+        if end > len(self.keys) and not self.complete:
+            return super().get_cursor_page(token)
+        # В неполном списке за последним ключом есть ещё посты
+        has_next = end < len(self.keys) or not self.complete
+        return self._page_for_keys(
+            self.keys[start:end], anchored, has_previous, has_next)
+
+    def _rows(self, page_keys):
+        return self.object_list.filter(pk__in=[pk for _, pk in page_keys])
+
+
+def get_page(request, slug):
+    """Группа и страница её ленты."""
+    group, keys, complete = get_feed(slug)
+    paginator = MaterializedPaginator(
+        group.posts.for_feed(), NUMBER_OF_POSTS, keys, complete)
+    return group, paginate(request, paginator)
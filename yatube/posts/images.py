@@ -0,0 +1,103 @@
+"""Обработка картинок постов при загрузке.
+
+Оригинал из формы не сохраняется как есть: многомегабайтные фото потом
+заново читает sorl-thumbnail при каждом промахе кеша миниатюр. Перед
+сохранением картинка:
+
+* поворачивается по EXIF, после чего все метаданные (EXIF с
+  координатами, ICC-профиль, комментарии) отбрасываются;
+* уменьшается до IMAGE_MAX_SIDE пикселей по большей стороне;
+* пересжимается: непрозрачная - в прогрессивный JPEG, с прозрачностью -
+  в WebP, если Pillow собран с его поддержкой, иначе в PNG. Анимация GIF
+  не сохраняется: шаблоны всё равно показывают миниатюру первого кадра.
+
+Ширина и высота результата записываются в пост, поэтому узнавать их,
+открывая файл, не нужно. Файл больше IMAGE_MAX_UPLOAD_SIZE байт и
+картинка больше IMAGE_MAX_PIXELS пикселей отклоняются до декодирования.
+"""
+import io
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps, features
+
+Processed = namedtuple('Processed', 'file width height')
+
+
+def _has_alpha(image):
+    # Палитровые и серые картинки хранят прозрачный цвет в info
+    return (image.mode in ('RGBA', 'LA', 'PA')
+            or 'transparency' in image.info)
+
+
+def _output_format(has_alpha):
+    """(формат Pillow, расширение, параметры сохранения)."""
+    if not has_alpha:
+        return 'JPEG', 'jpg', {
+            'quality': settings.IMAGE_QUALITY, 'optimize': True,
+            'progressive': True,
+        }
+    if features.check('webp'):
+        return 'WEBP', 'webp', {'quality': settings.IMAGE_QUALITY}
+    return 'PNG', 'png', {'optimize': True}
+
+
+def process(upload):
+    """Проверяет и пересжимает загруженную картинку.
+
+    Возвращает Processed: новый файл для ImageField и его размеры.
+    """
+    if upload.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            params={'limit': settings.IMAGE_MAX_UPLOAD_SIZE // 2 ** 20},
+            code='file_too_large')
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+        width, height = image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка больше %(limit)d мегапикселей.',
+                params={'limit': settings.IMAGE_MAX_PIXELS // 10 ** 6},
+                code='too_many_pixels')
+        image = ImageOps.exif_transpose(image)
+        has_alpha = _has_alpha(image)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Не удалось прочитать картинку.', code='invalid_image')
+    side = settings.IMAGE_MAX_SIDE
+    image.thumbnail((side, side), Image.LANCZOS)
+    image_format, extension, options = _output_format(has_alpha)
+    output = io.BytesIO()
+    image.save(output, image_format, **options)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return Processed(
+        SimpleUploadedFile(
+            f'{name}.{extension}', output.getvalue(),
+            content_type=Image.MIME[image_format]),
+        *image.size,
+    )
+
+
+def process_post_image(post):
+    """Пересжимает уже сохранённую картинку поста и записывает размеры.
+
+    Старый файл остаётся в хранилище. Возвращает False, если файла нет
+    или он не читается как картинка.
+    """
+    try:
+        with post.image.open('rb') as original:
+            processed = process(original)
+    except (FileNotFoundError, ValidationError):
+        return False
+    post.image.save(processed.file.name, processed.file, save=False)
+    post.image_width, post.image_height = processed.width, processed.height
+    # Новое имя файла меняет карточку поста: updated входит в её ключ
+    post.save(update_fields=[
+        'image', 'image_width', 'image_height', 'updated'])
+    return True
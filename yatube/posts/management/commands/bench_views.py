@@ -0,0 +1,122 @@
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts import benchmark
+
+VOLUMES = ('users', 'groups', 'posts', 'follows', 'comments', 'seed')
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'peak_kb')
+# Насколько медленнее по p95 страница считается регрессией
+REGRESSION = 1.1
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет отдельную базу SQLite сгенерированными данными и '
+        'замеряет страницы постов: перцентили времени ответа, число '
+        'запросов и память. Результат пишется в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        bench_dir = os.path.join(settings.BASE_DIR, 'bench')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на каждую страницу.')
+        parser.add_argument('--warm', action='store_true',
+                            help='Не очищать кеш перед запросами.')
+        parser.add_argument(
+            '--database', default=os.path.join(bench_dir, 'bench.sqlite3'),
+            help='Файл базы; пересоздаётся, если объёмы изменились.')
+        parser.add_argument(
+            '--output', default=os.path.join(bench_dir, 'results.json'))
+        parser.add_argument(
+            '--compare', help='JSON прошлого замера для сравнения.')
+
+    def use_database(self, path, volumes):
+        """Переключает соединение на базу замера и наполняет её.
+
+        Миграции применяются и к уже наполненной базе: иначе схема
+        отстанет от кода, замеряемого в следующих коммитах.
+        """
+        params_path = path + '.json'
+        try:
+            with open(params_path) as params:
+                seeded = json.load(params) == volumes
+        except (OSError, ValueError):
+            seeded = False
+        if not seeded and os.path.exists(path):
+            os.remove(path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        connection.close()
+        connection.settings_dict['NAME'] = path
+        call_command('migrate', verbosity=0)
+        if seeded:
+            return
+        self.stdout.write('Наполняем базу...')
+        counts = benchmark.seed(**volumes)
+        self.stdout.write(', '.join(f'{k}: {v}' for k, v in counts.items()))
+        with open(params_path, 'w') as params:
+            json.dump(volumes, params)
+
+    def handle(self, *args, **options):
+        volumes = {key: options[key] for key in VOLUMES}
+        self.use_database(options['database'], volumes)
+        with override_settings(DEBUG=False):
+            views = benchmark.measure(
+                requests=options['requests'], warm=options['warm'],
+                seed=options['seed'])
+        result = {
+            'commit': git_commit(),
+            'date': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'volumes': volumes,
+            'cache': 'warm' if options['warm'] else 'cold',
+            'max_rss_kb': benchmark.max_rss_kb(),
+            'views': views,
+        }
+        os.makedirs(os.path.dirname(options['output']) or '.', exist_ok=True)
+        with open(options['output'], 'w') as output:
+            json.dump(result, output, indent=2)
+        for name, metrics in views.items():
+            self.stdout.write(f'{name:>13}: ' + ', '.join(
+                f'{metric} {metrics[metric]}' for metric in METRICS))
+        if options['compare']:
+            with open(options['compare']) as previous:
+                self.compare(json.load(previous)['views'], views)
+
+    def compare(self, before, after):
+        for name, metrics in after.items():
+            if name not in before:
+                continue
+            old, new = before[name]['p95_ms'], metrics['p95_ms']
+            line = (
+                f'{name:>13}: p95 {old} -> {new} мс, запросов '
+                f"{before[name]['queries']} -> {metrics['queries']}")
+            if new > old * REGRESSION:
+                self.stdout.write(self.style.WARNING(line + ' (медленнее)'))
+            else:
+                self.stdout.write(line)
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test.utils import override_settings
+
+from posts import writebuffer
+from posts.models import Comment, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость записи комментариев с буфером записи и без '
+        'него: несколько потоков пишут в один файл SQLite.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--comments', type=int, default=200,
+                            help='Комментариев на один поток.')
+        parser.add_argument('--max-items', type=int, default=100)
+        parser.add_argument('--max-delay', type=float, default=0.02,
+                            help='Задержка пачки в секундах.')
+
+    def worker(self, post, user, count, errors):
+        try:
+            for i in range(count):
+                try:
+                    writebuffer.save(Comment(
+                        post_id=post.pk, author_id=user.pk,
+                        text=f'Комментарий {i}'))
+                except OperationalError:
+                    errors.append(i)
+        finally:
+            connections.close_all()
+
+    def run(self, post, user, options):
+        errors = []
+        threads = [
+            threading.Thread(target=self.worker, args=(
+                post, user, options['comments'], errors))
+            for _ in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        total = options['threads'] * options['comments']
+        return (total - len(errors)) / elapsed, len(errors)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            connection.close()
+            connection.settings_dict['NAME'] = os.path.join(
+                directory, 'bench.sqlite3')
+            call_command('migrate', verbosity=0)
+            user = User.objects.create_user(username='bench')
+            post = Post.objects.create(author=user, text='Популярный пост')
+            for enabled in (False, True):
+                with override_settings(
+                        WRITE_BUFFER_ENABLED=enabled,
+                        WRITE_BUFFER_MAX_ITEMS=options['max_items'],
+                        WRITE_BUFFER_MAX_DELAY=options['max_delay']):
+                    writebuffer.reset()
+                    rate, errors = self.run(post, user, options)
+                name = 'с буфером' if enabled else 'без буфера'
+                self.stdout.write(
+                    f'{name:>10}: {rate:.0f} комментариев/с, '
+                    f'ошибок блокировки {errors}')
+            self.stdout.write(
+                f'Всего комментариев: {Comment.objects.count()}')
+            connection.close()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.cards import reset_stats, stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кеша карточек постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить счётчики после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        hits, misses = stats()
+        total = hits + misses
+        ratio = hits / total * 100 if total else 0
+        self.stdout.write(
+            f'Попаданий: {hits}, промахов: {misses}, '
+            f'доля попаданий: {ratio:.1f}%'
+        )
+        if options['reset']:
+            reset_stats()
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.media_gc import BATCH_SIZE, collect
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые не ссылается ни один пост, '
+        'и миниатюры, о которых не знает sorl-thumbnail.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=None,
+            help='Не трогать файлы моложе стольких секунд '
+                 '(по умолчанию MEDIA_GC_GRACE).')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько файлов проверять одной пачкой.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено.')
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять раз в столько секунд; 0 - собрать один раз.')
+
+    def handle(self, *args, **options):
+        while True:
+            report = collect(
+                options['grace'], options['batch_size'], options['dry_run'])
+            removed, freed = (
+                ('Будет удалено', 'освободится') if options['dry_run']
+                else ('Удалено', 'освобождено'))
+            self.stdout.write(
+                f'{removed}: картинок {report["images"]}, '
+                f'миниатюр {report["thumbnails"]}, '
+                f'записей ImageBlob {report["blobs"]}; '
+                f'{freed} {report["bytes"] / 1024 ** 2:.1f} МБ '
+                f'({report["bytes"]} байт)')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
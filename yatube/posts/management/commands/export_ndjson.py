@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts.ndjson import BATCH_SIZE, MODELS, export
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает пользователей, группы, посты, комментарии и '
+        'подписки в NDJSON: по объекту на строку.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdout.')
+        parser.add_argument(
+            '--models', nargs='+', default=MODELS, choices=MODELS,
+            help='Какие модели выгружать.')
+        parser.add_argument('--chunk-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            exported = export(
+                self.stdout, options['models'], options['chunk_size'])
+        else:
+            with open(options['path'], 'w', encoding='utf-8') as stream:
+                exported = export(
+                    stream, options['models'], options['chunk_size'])
+        self.stderr.write(', '.join(
+            f'{label}: {count}' for label, count in exported.items()))
@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.ndjson import BATCH_SIZE, load
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает NDJSON, выгруженный export_ndjson, пачками bulk_create '
+        'и перестраивает индексы и счётчики после загрузки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdin.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='Пропускать строки, которые уже есть в базе.')
+
+    def handle(self, *args, **options):
+        params = {
+            'batch_size': options['batch_size'],
+            'ignore_conflicts': options['ignore_conflicts'],
+        }
+        try:
+            if options['path'] == '-':
+                loaded = load(sys.stdin, **params)
+            else:
+                with open(options['path'], encoding='utf-8') as stream:
+                    loaded = load(stream, **params)
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write('Загружено: ' + ', '.join(
+            f'{label}: {count}' for label, count in loaded.items()))
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+BATCH_SIZE = 500
+
+
+def generate_in_thread(name):
+    try:
+        return thumbnails.generate_logged(name)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Заранее готовит миниатюры для всех картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько картинок резать одновременно; 0 - в этом потоке.')
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by('pk').values_list(
+            'image', flat=True).iterator()
+        done = failed = 0
+        pool = None
+        if options['workers']:
+            pool = ThreadPoolExecutor(max_workers=options['workers'])
+        try:
+            while True:
+                batch = list(islice(names, BATCH_SIZE))
+                if not batch:
+                    break
+                if pool is None:
+                    results = map(thumbnails.generate_logged, batch)
+                else:
+                    results = pool.map(generate_in_thread, batch)
+                for ok in results:
+                    done += ok
+                    failed += not ok
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(f'Готово картинок: {done}, с ошибками: {failed}')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts.images import process_post_image
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересжимает картинки постов, загруженные до обработки загрузок, '
+        'и записывает их размеры. Миниатюры для новых файлов готовит '
+        'pregenerate_thumbnails.'
+    )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(
+            image_width__isnull=True).order_by('pk')
+        processed = missing = 0
+        for post in posts.iterator():
+            if process_post_image(post):
+                processed += 1
+            else:
+                missing += 1
+        self.stdout.write(
+            f'Обработано картинок: {processed}, пропущено: {missing}')
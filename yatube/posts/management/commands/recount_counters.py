@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_all
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправлять.',
+        )
+
+    def handle(self, *args, **options):
+        repaired = recount_all(dry_run=options['dry_run'])
+        verb = 'Расходится' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(
+            f"{verb}: пользователей {repaired['users']}, "
+            f"групп {repaired['groups']}, постов {repaired['posts']}"
+        )
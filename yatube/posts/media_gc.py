@@ -0,0 +1,215 @@
+"""Сборка мусора в медиафайлах: картинки постов и миниатюры sorl.
+
+Файл картинки поста осиротел, если на него не ссылается ни один пост и
+у его строки ImageBlob нет ссылок (см. blobs.py). Миниатюра осиротела,
+если о ней не знает хранилище ключей sorl-thumbnail. Вместе с картинкой
+удаляются её миниатюры и их ключи. Строки ImageBlob без ссылок и без
+файла удаляются в конце.
+
+Сборка идёт параллельно с загрузками, поэтому:
+
+* файлы моложе grace секунд не трогаются. Хранилище постов обновляет
+  дату изменения файла, когда повторная загрузка использует его снова;
+* перед удалением файл переименовывается в «надгробие», и ссылки на него
+  проверяются ещё раз. Загрузка, которая не нашла файл, пишет его заново
+  (имя - хеш содержимого, байты те же), а если ссылка успела появиться,
+  надгробие возвращается на место.
+
+Каталоги обходятся пачками по batch_size имён: на пачку - два запроса.
+"""
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import ImageBlob, Post
+from posts.storage import post_images
+
+BATCH_SIZE = 500
+TOMBSTONE = '.gc'
+POSTS_DIR = 'posts'
+
+
+def _walk(storage, directory, cutoff):
+    """Имена файлов каталога хранилища, изменённых раньше cutoff."""
+    location = storage.path('')
+    for root, _, files in os.walk(storage.path(directory)):
+        for filename in files:
+            path = os.path.join(root, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            # Свежее надгробие принадлежит идущей сборке; переименование
+            # меняет ctime, а не mtime.
+            if filename.endswith(TOMBSTONE) and stat.st_ctime >= cutoff:
+                continue
+            if stat.st_mtime < cutoff:
+                yield os.path.relpath(path, location).replace(os.sep, '/')
+
+
+def _batches(names, size):
+    batch = []
+    for name in names:
+        batch.append(name)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _remove(path, referenced, cutoff, dry_run=False):
+    """Удаляет файл, если он всё ещё не нужен. Возвращает его размер или 0."""
+    if dry_run:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return 0
+        return 0 if stat.st_mtime >= cutoff or referenced() else stat.st_size
+    tombstone = path + TOMBSTONE
+    try:
+        os.replace(path, tombstone)
+    except FileNotFoundError:
+        return 0
+    stat = os.stat(tombstone)
+    if stat.st_mtime >= cutoff or referenced():
+        os.replace(tombstone, path)
+        return 0
+    os.remove(tombstone)
+    return stat.st_size
+
+
+def _image_referenced(name, since):
+    def referenced():
+        return (
+            Post.objects.filter(image=name).exists()
+            or ImageBlob.objects.filter(
+                Q(refs__gt=0) | Q(updated__gte=since), name=name).exists()
+        )
+    return referenced
+
+
+def _thumbnail_referenced(key):
+    return lambda: default.kvstore._get(key) is not None
+
+
+def _drop_thumbnails(name, cutoff, dry_run):
+    """Удаляет миниатюры картинки и их ключи. Возвращает (число, байты)."""
+    kvstore = default.kvstore
+    source = ImageFile(name, post_images)
+    removed = reclaimed = 0
+    for key in kvstore._get(source.key, identity='thumbnails') or []:
+        thumbnail = kvstore._get(key)
+        if thumbnail is None:
+            continue
+        path = thumbnail.storage.path(thumbnail.name)
+        if dry_run:
+            # Ключ ещё на месте: миниатюра считается так, будто его нет
+            size = _remove(path, lambda: False, cutoff, dry_run)
+        else:
+            kvstore._delete(key)
+            size = _remove(path, _thumbnail_referenced(key), cutoff)
+        if size:
+            removed += 1
+            reclaimed += size
+    if not dry_run:
+        kvstore._delete(source.key, identity='thumbnails')
+        kvstore._delete(source.key)
+    return removed, reclaimed
+
+
+def _collect_images(cutoff, since, batch_size, dry_run, report):
+    """Удаляет осиротевшие картинки. Возвращает множество их имён."""
+    collected = set()
+    names = _walk(post_images, POSTS_DIR, cutoff)
+    for batch in _batches(names, batch_size):
+        kept = set(Post.objects.filter(image__in=batch).values_list(
+            'image', flat=True))
+        kept.update(ImageBlob.objects.filter(
+            Q(refs__gt=0) | Q(updated__gte=since),
+            name__in=batch).values_list('name', flat=True))
+        for name in batch:
+            if name in kept:
+                continue
+            size = _remove(
+                post_images.path(name), _image_referenced(name, since),
+                cutoff, dry_run)
+            if not size:
+                continue
+            collected.add(name)
+            report['images'] += 1
+            report['bytes'] += size
+            removed, reclaimed = _drop_thumbnails(name, cutoff, dry_run)
+            report['thumbnails'] += removed
+            report['bytes'] += reclaimed
+    return collected
+
+
+def _collect_thumbnails(cutoff, batch_size, dry_run, report):
+    kvstore = default.kvstore
+    storage = default.storage
+    # Ключи sorl - хеши имени и хранилища, поэтому известные имена
+    # собираются заранее одним проходом по хранилищу ключей.
+    known = set()
+    for key in kvstore._find_keys(identity='image'):
+        image = kvstore._get(key)
+        if image is not None:
+            known.add(image.name)
+    names = _walk(storage, thumbnail_settings.THUMBNAIL_PREFIX, cutoff)
+    for batch in _batches(names, batch_size):
+        for name in batch:
+            if name in known:
+                continue
+            size = _remove(
+                storage.path(name),
+                _thumbnail_referenced(ImageFile(name, storage).key),
+                cutoff, dry_run)
+            if size:
+                report['thumbnails'] += 1
+                report['bytes'] += size
+
+
+def _collect_blobs(since, collected, batch_size, dry_run, report):
+    stale = ImageBlob.objects.filter(refs=0, updated__lt=since)
+    rows = stale.order_by('pk').values_list('pk', 'name')
+    last = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last)[:batch_size])
+        if not batch:
+            return
+        last = batch[-1][0]
+        missing = [
+            pk for pk, name in batch
+            if name in collected or not post_images.exists(name)
+        ]
+        if dry_run:
+            report['blobs'] += len(missing)
+        elif missing:
+            # Условие повторяется в DELETE: строку, на которую успели
+            # сослаться, запрос не удалит.
+            report['blobs'] += stale.filter(pk__in=missing).delete()[0]
+
+
+def collect(grace=None, batch_size=BATCH_SIZE, dry_run=False):
+    """Удаляет осиротевшие картинки и миниатюры. Возвращает отчёт.
+
+    Отчёт - {'images', 'thumbnails', 'blobs', 'bytes'}: сколько удалено
+    картинок, миниатюр, строк ImageBlob и освобождено байт. С dry_run
+    ничего не удаляется, а отчёт показывает, что было бы удалено.
+    """
+    if grace is None:
+        grace = settings.MEDIA_GC_GRACE
+    cutoff = time.time() - grace
+    since = timezone.now() - timedelta(seconds=grace)
+    report = {'images': 0, 'thumbnails': 0, 'blobs': 0, 'bytes': 0}
+    collected = _collect_images(cutoff, since, batch_size, dry_run, report)
+    _collect_thumbnails(cutoff, batch_size, dry_run, report)
+    _collect_blobs(since, collected, batch_size, dry_run, report)
+    return report
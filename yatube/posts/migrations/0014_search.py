@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                'CREATE VIRTUAL TABLE posts_search USING fts5('
+                " text, comments, tokenize = 'unicode61 remove_diacritics 2',"
+                " prefix = '2 3')",
+                'INSERT INTO posts_search (rowid, text, comments) '
+                'SELECT p.id, p.text, ('
+                " SELECT COALESCE(group_concat(c.text, ' '), '') "
+                ' FROM posts_comment c WHERE c.post_id = p.id'
+                ') FROM posts_post p',
+            ],
+            'DROP TABLE posts_search',
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:14
+
+from django.db import migrations, models
+from django.db.models import Count
+
+import posts.storage
+
+
+def fill_blobs(apps, schema_editor):
+    """Считает ссылки на картинки, загруженные до счётчиков."""
+    Post = apps.get_model('posts', 'Post')
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    refs = Post.objects.exclude(image='').values_list('image').annotate(
+        total=Count('pk')).order_by()
+    ImageBlob.objects.bulk_create(
+        ImageBlob(name=name, refs=total) for name, total in refs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Имя файла')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Здесь можно добавить картинку', storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(fill_blobs, migrations.RunPython.noop),
+    ]
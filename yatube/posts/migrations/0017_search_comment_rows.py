@@ -0,0 +1,35 @@
+from django.db import migrations
+
+TOKENIZE = (
+    " tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_image_blobs'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                'DROP TABLE posts_search',
+                'CREATE VIRTUAL TABLE posts_search USING fts5('
+                ' text, comments, post_id UNINDEXED,' + TOKENIZE,
+                'INSERT INTO posts_search (rowid, text, comments, post_id) '
+                "SELECT p.id, p.text, '', p.id FROM posts_post p",
+                'INSERT INTO posts_search (rowid, text, comments, post_id) '
+                "SELECT -c.id, '', c.text, c.post_id FROM posts_comment c",
+            ],
+            [
+                'DROP TABLE posts_search',
+                'CREATE VIRTUAL TABLE posts_search USING fts5('
+                ' text, comments,' + TOKENIZE,
+                'INSERT INTO posts_search (rowid, text, comments) '
+                'SELECT p.id, p.text, ('
+                " SELECT COALESCE(group_concat(c.text, ' '), '') "
+                ' FROM posts_comment c WHERE c.post_id = p.id'
+                ') FROM posts_post p',
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_search_comment_rows'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_pull_author_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_user_created_idx',
+        ),
+        migrations.AddField(
+            model_name='follow',
+            name='backfill_created',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата начала ленты автора'),
+        ),
+        migrations.AddField(
+            model_name='follow',
+            name='backfill_pk',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Пост начала ленты автора'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(fanned_out=False), fields=['author', '-created', '-id'], name='post_pull_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-created', '-post'], name='timeline_user_created_idx'),
+        ),
+    ]
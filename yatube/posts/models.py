@@ -1,11 +1,19 @@
-from core.models import CreatedModel
+from core.models import AtomicSaveModel, CreatedModel
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import post_images
+
 User = get_user_model()
 
 LENGTH_TEXT = 15
 """Количество символов"""
+FEED_DEFERRED_FIELDS = (
+    'fanned_out',
+    'author__password',
+    'group__description',
+)
+"""Поля, которые карточки постов в лентах не показывают"""
 
 
 class Group (models.Model):
@@ -13,6 +21,11 @@ class Group (models.Model):
     title = models.CharField(max_length=200, verbose_name='Заголовок',)
     slug = models.SlugField(max_length=200, unique=True,)
     description = models.TextField(verbose_name='Описание группы',)
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return self.title
@@ -23,7 +36,16 @@ class Group (models.Model):
         verbose_name_plural = 'Группы'
 
 
-class Post(CreatedModel, models.Model):
+class PostQuerySet(models.QuerySet):
+    """Выборки постов."""
+
+    def for_feed(self):
+        """Посты для лент: автор и группа одним запросом."""
+        return self.select_related('author', 'group').defer(
+            *FEED_DEFERRED_FIELDS)
+
+
+class Post(CreatedModel, AtomicSaveModel):
     """ Главная страница."""
     text = models.TextField(
         verbose_name='Текст поста',
@@ -47,20 +69,69 @@ class Post(CreatedModel, models.Model):
         verbose_name='Картинка',
         help_text='Здесь можно добавить картинку',
         upload_to='posts/',
+        storage=post_images,
         blank=True
     )
+    # Размеры заполняет обработка загрузки (см. images.py). Это не
+    # width_field/height_field: те открывают файл картинки при создании
+    # каждого объекта поста, у которого размеры ещё не записаны.
+    image_width = models.PositiveIntegerField(
+        verbose_name='Ширина картинки',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        verbose_name='Высота картинки',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    fanned_out = models.BooleanField(
+        verbose_name='Разослан подписчикам',
+        default=False,
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Количество комментариев',
+        default=0,
+        editable=False,
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         """Переопределение Meta."""
         verbose_name = 'Посты авторов'
         verbose_name_plural = 'Посты авторов'
         ordering = ['-created']
+        indexes = [
+            # id в конце индекса нужен ключу паджинации (created, id):
+            # без него SQLite досортировывает страницу во временном B-tree.
+            models.Index(
+                fields=['-created', '-id'], name='post_created_idx'),
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='post_author_created_idx'),
+            models.Index(
+                fields=['group', '-created', '-id'],
+                name='post_group_created_idx'),
+            # Посты, которые лента подписок дочитывает сама (fan-out-on-read).
+            models.Index(
+                fields=['author', '-created', '-id'],
+                condition=models.Q(fanned_out=False),
+                name='post_pull_author_idx'),
+        ]
 
     def __str__(self):
         return self.text[:LENGTH_TEXT]
 
 
-class Comment(models.Model):
+class Comment(AtomicSaveModel):
     """Класс для комментирования записей."""
 
     post = models.ForeignKey(
@@ -89,12 +160,17 @@ class Comment(models.Model):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:LENGTH_TEXT]
 
 
-class Follow(models.Model):
+class Follow(AtomicSaveModel):
     """Параметры добавления новых подписок."""
 
     user = models.ForeignKey(
@@ -107,6 +183,21 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+    # Ключ (created, id) самого старого поста, скопированного в ленту
+    # при подписке. Более старые посты автора лента дочитывает сама
+    # (см. timeline.py).
+    backfill_created = models.DateTimeField(
+        verbose_name='Дата начала ленты автора',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    backfill_pk = models.PositiveIntegerField(
+        verbose_name='Пост начала ленты автора',
+        blank=True,
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Подписка'
@@ -120,6 +211,97 @@ class Follow(models.Model):
                 name='author'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'),
+        ]
 
     def __str__(self):
         return f"Подписчик: '{self.user}' на автора: '{self.author}'"
+
+
+class TimelineEntry(models.Model):
+    """Запись в материализованной ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    created = models.DateTimeField(verbose_name='Дата публикации поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-post'],
+                name='timeline_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Лента '{self.user}': пост {self.post_id}"
+
+
+class UserCounter(models.Model):
+    """Денормализованные счётчики пользователя."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='counter'
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Количество подписок',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return f"Счётчики '{self.user}'"
+
+
+class ImageBlob(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+
+    name = models.CharField(
+        verbose_name='Имя файла',
+        max_length=100,
+        unique=True,
+    )
+    refs = models.PositiveIntegerField(
+        verbose_name='Количество ссылок',
+        default=0,
+    )
+    updated = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return f'{self.name}: {self.refs}'
@@ -0,0 +1,130 @@
+"""Полнотекстовый поиск по постам и комментариям (SQLite FTS5).
+
+В виртуальной таблице posts_search у поста и у каждого комментария своя
+строка: текст поста лежит в колонке text под rowid, равным id поста,
+текст комментария - в колонке comments под rowid, равным минус id
+комментария. Колонка post_id (не индексируется) связывает строку с
+постом, найденные строки группируются по ней. Новый комментарий - одна
+вставка, а не пересборка строки поста со всеми его комментариями.
+
+Все слова запроса должны найтись в одной строке: в тексте поста или в
+одном комментарии. Строки обновляются сигналами при сохранении и
+удалении постов и комментариев, целиком таблицу пересобирает команда
+rebuild_search_index.
+"""
+import re
+
+from django.db import connection, transaction
+
+WORD = re.compile(r'\w+')
+# Совпадение в тексте поста весит вдвое больше, чем в комментариях
+RANK = 'bm25(posts_search, 2.0, 1.0)'
+
+INDEX_POSTS_SQL = (
+    'INSERT INTO posts_search (rowid, text, comments, post_id) '
+    "SELECT p.id, p.text, '', p.id FROM posts_post p"
+)
+INDEX_COMMENTS_SQL = (
+    'INSERT INTO posts_search (rowid, text, comments, post_id) '
+    "SELECT -c.id, '', c.text, c.post_id FROM posts_comment c"
+)
+
+
+def to_match(query):
+    """Запрос пользователя в выражение MATCH: все слова, по префиксу.
+
+    Операторы FTS5 из запроса не попадают, поэтому любая строка
+    даёт корректное выражение.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query.lower()))
+
+
+def index_post(post_id):
+    """Перестраивает строку поста; для удалённого поста просто её убирает.
+
+    Строки комментариев поста не трогаются.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM posts_search WHERE rowid = %s', [post_id])
+        cursor.execute(INDEX_POSTS_SQL + ' WHERE p.id = %s', [post_id])
+
+
+def remove_post(post_id):
+    """Убирает строку поста.
+
+    Строки комментариев убирает remove_comment: каскадное удаление
+    посылает сигнал на каждый комментарий.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM posts_search WHERE rowid = %s', [post_id])
+
+
+def index_comments(comments):
+    """Добавляет или заменяет строки сохранённых комментариев."""
+    rows = [(-comment.pk, comment.text, comment.post_id)
+            for comment in comments]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            'DELETE FROM posts_search WHERE rowid = %s',
+            [(rowid,) for rowid, _, _ in rows])
+        cursor.executemany(
+            'INSERT INTO posts_search (rowid, text, comments, post_id) '
+            "VALUES (%s, '', %s, %s)", rows)
+
+
+def remove_comment(comment_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM posts_search WHERE rowid = %s', [-comment_id])
+
+
+def rebuild():
+    """Заново индексирует все посты. Возвращает их количество."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('DELETE FROM posts_search')
+        cursor.execute(INDEX_POSTS_SQL)
+        indexed = cursor.rowcount
+        cursor.execute(INDEX_COMMENTS_SQL)
+        cursor.execute(
+            "INSERT INTO posts_search (posts_search) VALUES ('optimize')")
+    return indexed
+
+
+class SearchResults:
+    """Найденные посты по убыванию релевантности.
+
+    Отдаёт Paginator count() и срезы: в базу уходит только id постов
+    нужной страницы, сами посты читаются из queryset одним запросом.
+    """
+
+    def __init__(self, query, queryset):
+        self.match = to_match(query)
+        self.queryset = queryset
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(DISTINCT post_id) FROM posts_search '
+                'WHERE posts_search MATCH %s', [self.match])
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, item):
+        if not self.match or item.start >= item.stop:
+            return []
+        with connection.cursor() as cursor:
+            # Пост ранжируется по лучшей из своих строк. bm25 нельзя
+            # звать внутри агрегата, а LIMIT -1 не даёт SQLite
+            # развернуть подзапрос во внешний.
+            cursor.execute(
+                f'SELECT post_id FROM (SELECT post_id, {RANK} AS score '
+                'FROM posts_search WHERE posts_search MATCH %s LIMIT -1) '
+                'GROUP BY post_id ORDER BY MIN(score), post_id DESC '
+                'LIMIT %s OFFSET %s',
+                [self.match, item.stop - item.start, item.start])
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
@@ -0,0 +1,135 @@
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import blobs, caching, counters, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+
+def bump_post_pages(post, previous_group_id=None):
+    """Новое поколение для всех страниц, на которых виден пост."""
+    group_ids = {post.group_id, previous_group_id} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True) if group_ids else []
+    caching.bump(
+        caching.INDEX,
+        caching.post_scope(post.pk),
+        caching.profile_scope(post.author.username),
+        *(caching.group_scope(slug) for slug in slugs),
+    )
+
+
+def bump_profiles(*user_ids):
+    caching.bump(*(
+        caching.profile_scope(username) for username in
+        User.objects.filter(pk__in=user_ids).values_list(
+            'username', flat=True)
+    ))
+
+
+def comments_added(comments):
+    """Счётчики, поиск и кеш после добавления сохранённых комментариев.
+
+    Вызывается сигналом и буфером записи (см. writebuffer.py).
+    """
+    added = Counter(comment.post_id for comment in comments)
+    for post_id, count in added.items():
+        counters.change_post(post_id, count)
+    search.index_comments(comments)
+    caching.bump(*(caching.post_scope(post_id) for post_id in added))
+
+
+def follows_added(follows):
+    """Таймлайны, счётчики и кеш после новых подписок."""
+    followers = Counter(follow.author_id for follow in follows)
+    following = Counter(follow.user_id for follow in follows)
+    for follow in follows:
+        timeline.backfill(follow.user_id, follow.author_id)
+    for user_id, count in followers.items():
+        counters.change_user(user_id, followers_count=count)
+    for user_id, count in following.items():
+        counters.change_user(user_id, following_count=count)
+    bump_profiles(*(followers.keys() | following.keys()))
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, raw=False, **kwargs):
+    """Переименование группы сбрасывает кеш старого и нового адреса."""
+    if raw or instance._state.adding:
+        return
+    old_slug = Group.objects.filter(pk=instance.pk).values_list(
+        'slug', flat=True).first()
+    caching.bump(
+        caching.group_scope(old_slug), caching.group_scope(instance.slug))
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    """Запоминает группу и картинку поста до редактирования."""
+    instance._previous_group_id = instance._previous_image = None
+    if not raw and not instance._state.adding:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image').first() or (None, None))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    """Новый пост попадает в ленты подписчиков и в счётчики."""
+    if raw:
+        return
+    if created:
+        timeline.fan_out(instance)
+        counters.change_user(instance.author_id, posts_count=1)
+        counters.change_group(instance.group_id, 1)
+    elif instance._previous_group_id != instance.group_id:
+        counters.change_group(instance._previous_group_id, -1)
+        counters.change_group(instance.group_id, 1)
+    if instance._previous_image != instance.image.name:
+        blobs.acquire(instance.image.name)
+        blobs.release(instance._previous_image)
+    search.index_post(instance.pk)
+    bump_post_pages(instance, instance._previous_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, posts_count=-1)
+    counters.change_group(instance.group_id, -1)
+    blobs.release(instance.image.name)
+    search.remove_post(instance.pk)
+    bump_post_pages(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        comments_added([instance])
+    else:
+        search.index_comments([instance])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, -1)
+    search.remove_comment(instance.pk)
+    caching.bump(caching.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    """Подписка подтягивает последние посты автора в ленту."""
+    if created and not raw:
+        follows_added([instance])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Отписка убирает посты автора из ленты."""
+    timeline.prune(instance.user_id, instance.author_id)
+    counters.change_user(instance.author_id, followers_count=-1)
+    counters.change_user(instance.user_id, following_count=-1)
+    bump_profiles(instance.author_id, instance.user_id)
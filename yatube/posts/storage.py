@@ -0,0 +1,68 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл называется SHA-256 своего содержимого: posts/ab/abcdef...jpg.
+Повторно загруженная картинка получает то же имя, файл не пишется
+второй раз, и sorl-thumbnail находит для него уже готовые миниатюры:
+их ключ строится из имени файла.
+
+Запись идёт во временный файл рядом с целевым и переименованием на
+место, поэтому две одновременные загрузки одной картинки не мешают
+друг другу: обе записывают одинаковые байты под одно имя. Повторная
+загрузка обновляет дату изменения готового файла, чтобы сборка мусора
+не удалила его до сохранения поста.
+
+Сколько постов ссылается на файл, считает модель ImageBlob (blobs.py).
+"""
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    """SHA-256 файла; позиция чтения возвращается в начало."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in iter(lambda: content.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который именует файлы хешем содержимого."""
+
+    def hashed_name(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.hashed_name(name, content)
+        try:
+            # Свежая дата изменения защищает файл от сборки мусора
+            # (см. media_gc.py), пока пост с ним не сохранён.
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя - одинаковое содержимое: суффиксы не нужны
+        return name
+
+    def _save(self, name, content):
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+
+post_images = ContentAddressedStorage()
@@ -0,0 +1,24 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.cards import card_key, get_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка поста из кеша.
+
+    При первом вызове на странице из кеша читаются карточки всех постов
+    page_obj, поэтому остальные вызовы обходятся без обращения к кешу.
+    """
+    cards = context.render_context.get('post_cards')
+    if cards is None:
+        page_obj = context.get('page_obj')
+        cards = get_cards(list(page_obj) if page_obj else [post])
+        context.render_context['post_cards'] = cards
+    key = card_key(post)
+    if key not in cards:
+        cards.update(get_cards([post]))
+    return mark_safe(cards[key])
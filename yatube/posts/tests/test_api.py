@@ -0,0 +1,139 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import api
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    """JSON-ленты и условные запросы к ним."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(12):
+            cls.post = Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.group)
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feeds(self):
+        """Ленты отдают страницу постов и курсор следующей."""
+        urls = [
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', kwargs={'slug': 'test-group'}),
+            reverse('posts:api_profile', kwargs={'username': 'author'}),
+            reverse('posts:api_follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.reader_client.get(url).json()
+                self.assertEqual(len(data['results']), 10)
+                self.assertEqual(data['results'][0], {
+                    'id': self.post.pk,
+                    'text': 'Пост 11',
+                    'created': self.post.created.isoformat()[:23] + 'Z',
+                    'updated': self.post.updated.isoformat()[:23] + 'Z',
+                    'author': 'author',
+                    'group': 'test-group',
+                    'image': None,
+                    'image_width': None,
+                    'image_height': None,
+                })
+                rest = self.reader_client.get(
+                    url, {'cursor': data['next_cursor']}).json()
+                self.assertEqual(len(rest['results']), 2)
+                self.assertIsNone(rest['next_cursor'])
+
+    def test_post_detail(self):
+        url = reverse(
+            'posts:api_post_detail', kwargs={'post_id': self.post.pk})
+        data = self.client.get(url).json()
+        self.assertEqual(data['text'], 'Пост 11')
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Комментарий'])
+        self.assertIsNone(data['comments_next_cursor'])
+        comments = self.client.get(reverse(
+            'posts:api_post_comments', kwargs={'post_id': self.post.pk}))
+        self.assertEqual(comments.json()['results'], data['comments'])
+        missing = reverse('posts:api_post_detail', kwargs={'post_id': 999})
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_image_url_from_post_storage(self):
+        """Адрес картинки строит хранилище картинок постов."""
+        row = {
+            'pk': 1, 'text': 'Пост', 'created': None, 'updated': None,
+            'author__username': 'author', 'group__slug': None,
+            'image': 'posts/ab/abc.gif', 'image_width': 1, 'image_height': 1,
+        }
+        with mock.patch.object(
+                api.post_images, 'url', return_value='/cdn/abc.gif') as url:
+            self.assertEqual(api.serialize_post(row)['image'], '/cdn/abc.gif')
+        url.assert_called_once_with('posts/ab/abc.gif')
+
+    def test_profile_queries(self):
+        """Лента автора: автор, ключи страницы и её посты."""
+        url = reverse('posts:api_profile', kwargs={'username': 'author'})
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+    def test_follow_requires_login(self):
+        response = self.client.get(reverse('posts:api_follow_index'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304 без запросов к базе."""
+        url = reverse('posts:api_index')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertNotIn('Last-Modified', response)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(len(queries), 0)
+        cursor = self.client.get(url, {'cursor': 'x'})
+        self.assertNotEqual(cursor['ETag'], etag)
+
+    def test_changes_refresh_etag(self):
+        """Новый пост, правка и комментарий меняют ETag своих лент."""
+        index = reverse('posts:api_index')
+        detail = reverse(
+            'posts:api_post_detail', kwargs={'post_id': self.post.pk})
+        follow = reverse('posts:api_follow_index')
+        before = {
+            url: self.reader_client.get(url)['ETag']
+            for url in (index, detail, follow)
+        }
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Ещё комментарий')
+        self.assertNotEqual(
+            self.reader_client.get(detail)['ETag'], before[detail])
+        self.assertEqual(self.reader_client.get(index)['ETag'], before[index])
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        for url in (index, follow):
+            response = self.reader_client.get(
+                url, HTTP_IF_NONE_MATCH=before[url])
+            self.assertEqual(response.status_code, 200)
@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase
+
+from posts import benchmark
+from posts.management.commands import bench_views
+from posts.models import Comment, Post, UserCounter
+
+
+class BenchmarkTest(TestCase):
+    """Генерация данных и замер страниц для нагрузочного теста."""
+    def test_seed_and_measure(self):
+        counts = benchmark.seed(
+            users=20, groups=3, posts=60, follows=40, comments=30)
+        self.assertEqual(counts, {
+            'users': 20, 'groups': 3, 'posts': 60,
+            'follows': 40, 'comments': 30,
+        })
+        # Даты постов различны и растут вместе с id
+        created = list(Post.objects.order_by('pk').values_list(
+            'created', flat=True))
+        self.assertEqual(created, sorted(set(created)))
+        self.assertFalse(Comment.objects.filter(
+            created__lt=Post.objects.order_by('created').first().created
+        ).exists())
+        self.assertEqual(UserCounter.objects.count(), 20)
+
+        results = benchmark.measure(requests=3)
+        self.assertEqual(set(results), {
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index'})
+        for metrics in results.values():
+            self.assertLessEqual(metrics['p50_ms'], metrics['p99_ms'])
+            self.assertGreater(metrics['queries'], 0)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 0.5), 50)
+        self.assertEqual(benchmark.percentile(values, 0.99), 99)
+        self.assertEqual(benchmark.percentile([7], 0.95), 7)
+
+    def test_seeded_database_is_migrated(self):
+        """Наполненная база не наполняется заново, но мигрирует."""
+        volumes = {'users': 1}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            open(path, 'w').close()
+            with open(path + '.json', 'w') as params:
+                json.dump(volumes, params)
+            command = bench_views.Command()
+            with mock.patch.object(bench_views, 'connection'):
+                with mock.patch.object(
+                        bench_views, 'call_command') as call:
+                    with mock.patch.object(benchmark, 'seed') as seed:
+                        command.use_database(path, volumes)
+            self.assertTrue(os.path.exists(path))
+        call.assert_called_once_with('migrate', verbosity=0)
+        seed.assert_not_called()
@@ -0,0 +1,78 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, UserCounter
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    """Проверка денормализованных счётчиков."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-group',
+            description='Тестовое описание',
+        )
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        author_counter = UserCounter.objects.get(user=self.author)
+        self.assertEqual(author_counter.posts_count, 1)
+        self.assertEqual(author_counter.followers_count, 1)
+        self.assertEqual(
+            UserCounter.objects.get(user=self.reader).following_count, 1)
+
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(
+            UserCounter.objects.get(user=self.author).followers_count, 0)
+        post.delete()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.other_group.posts_count, 0)
+        self.assertEqual(
+            UserCounter.objects.get(user=self.author).posts_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount_counters чинит расхождения."""
+        Post.objects.bulk_create([
+            Post(author=self.author, text='Пост', group=self.group),
+            Post(author=self.author, text='Пост', group=self.group),
+        ])
+        out = StringIO()
+        call_command('recount_counters', stdout=out)
+        self.assertIn('групп 1', out.getvalue())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 2)
+        self.assertEqual(
+            UserCounter.objects.get(user=self.author).posts_count, 2)
@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from posts import groupfeed
+from posts.models import Group, Post
+from posts.utils import NUMBER_OF_POSTS, KeysetPaginator, paginate
+
+User = get_user_model()
+
+COUNT_TEST_POSTS = 27
+FEED_SIZE = 20
+
+
+@override_settings(GROUP_FEED_SIZE=FEED_SIZE)
+class GroupFeedTest(TestCase):
+    """Лента группы из готового списка id совпадает с живой лентой."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.other = Group.objects.create(title='Другая', slug='other')
+        for i in range(COUNT_TEST_POSTS):
+            Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def page(self, cursor=None):
+        request = self.factory.get('/', {'cursor': cursor} if cursor else {})
+        return groupfeed.get_page(request, 'group')[1]
+
+    def live_page(self, cursor=None):
+        request = self.factory.get('/', {'cursor': cursor} if cursor else {})
+        return paginate(request, KeysetPaginator(
+            Group.objects.get(slug='group').posts.all(), NUMBER_OF_POSTS))
+
+    def ids(self, page):
+        return [post.pk for post in page]
+
+    def test_pages_match_live_feed(self):
+        """Вперёд до конца и назад: те же посты и курсоры."""
+        cursor, visited = None, []
+        while True:
+            page, live = self.page(cursor), self.live_page(cursor)
+            self.assertEqual(self.ids(page), self.ids(live))
+            self.assertEqual(page.next_cursor, live.next_cursor)
+            self.assertEqual(page.previous_cursor, live.previous_cursor)
+            visited.append(page)
+            if not page.next_cursor:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(
+            sum(len(page) for page in visited), COUNT_TEST_POSTS)
+        cursor = visited[-1].previous_cursor
+        while cursor:
+            page, live = self.page(cursor), self.live_page(cursor)
+            self.assertEqual(self.ids(page), self.ids(live))
+            cursor = page.previous_cursor
+
+    def test_materialized_page_single_query(self):
+        """Со списком в кеше страница стоит одного запроса по id."""
+        self.ids(self.page())
+        with self.assertNumQueries(1):
+            self.ids(self.page(self.page().next_cursor))
+
+    def test_list_follows_writes(self):
+        """Новый, перенесённый и удалённый пост меняют список."""
+        self.ids(self.page())
+        post = Post.objects.create(
+            author=self.author, text='Новый', group=self.group)
+        self.assertEqual(self.ids(self.page())[0], post.pk)
+        post.group = self.other
+        post.save()
+        self.assertNotIn(post.pk, self.ids(self.page()))
+        newest = Post.objects.filter(group=self.group).latest('created')
+        newest.delete()
+        self.assertNotIn(newest.pk, self.ids(self.page()))
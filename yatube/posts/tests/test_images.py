@@ -0,0 +1,122 @@
+import io
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import cards, images
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+# Тег EXIF Orientation: 6 - повернуть на 90° по часовой стрелке
+ORIENTATION = 0x0112
+
+
+def photo(size=(3000, 2000), name='photo.jpg', mode='RGB', image_format=None,
+          orientation=None):
+    image = Image.new(mode, size, 'red')
+    output = io.BytesIO()
+    options = {}
+    if orientation:
+        exif = Image.Exif()
+        exif[ORIENTATION] = orientation
+        options['exif'] = exif.tobytes()
+    image.save(output, image_format or 'JPEG', **options)
+    return SimpleUploadedFile(name, output.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageProcessingTest(TestCase):
+    """Загруженные картинки пересжимаются до сохранения."""
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_photo_capped_rotated_and_stripped(self):
+        processed = images.process(photo(orientation=6))
+        self.assertEqual((processed.width, processed.height), (1280, 1920))
+        image = Image.open(processed.file)
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (1280, 1920))
+        self.assertTrue(image.info.get('progressive'))
+        self.assertNotIn('exif', image.info)
+        self.assertEqual(processed.file.name, 'photo.jpg')
+
+    def test_transparency_kept(self):
+        processed = images.process(photo(
+            (10, 10), 'logo.png', mode='RGBA', image_format='PNG'))
+        image = Image.open(processed.file)
+        self.assertEqual(image.mode, 'RGBA')
+        self.assertIn(image.format, ('PNG', 'WEBP'))
+
+    @override_settings(IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_large_file_rejected(self):
+        with self.assertRaises(ValidationError):
+            images.process(photo())
+
+    @override_settings(IMAGE_MAX_PIXELS=2 * 10 ** 6)
+    def test_too_many_pixels_rejected(self):
+        response = self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост', 'image': photo((2000, 2000))})
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 2 мегапикселей.')
+        self.assertFalse(Post.objects.exists())
+
+    def test_dimensions_recorded(self):
+        """Форма записывает размеры, удаление картинки их сбрасывает."""
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост', 'image': photo((2400, 600))})
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (1920, 480))
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {'text': 'Пост', 'image-clear': 'on'})
+        post.refresh_from_db()
+        self.assertFalse(post.image)
+        self.assertIsNone(post.image_width)
+
+    def test_command_processes_old_images(self):
+        post = Post.objects.create(
+            author=self.user, text='Старый пост', image=photo(name='old.jpg'))
+        self.assertIsNone(post.image_width)
+        out = StringIO()
+        call_command('process_images', stdout=out)
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (1920, 1280))
+        self.assertIn('Обработано картинок: 1', out.getvalue())
+
+    def test_processing_refreshes_card(self):
+        """Карточка после пересжатия показывает новый файл."""
+        post = Post.objects.create(
+            author=self.user, text='Старый пост', image=photo(name='old.jpg'))
+        cache.clear()
+        before = Post.objects.for_feed().get(pk=post.pk)
+        old_card = cards.get_cards([before])[cards.card_key(before)]
+        self.assertTrue(images.process_post_image(post))
+        after = Post.objects.for_feed().get(pk=post.pk)
+        self.assertNotEqual(after.image.name, before.image.name)
+        new_card = cards.get_cards([after])[cards.card_key(after)]
+        self.assertNotEqual(new_card, old_card)
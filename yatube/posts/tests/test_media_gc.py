@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import media_gc, thumbnails
+from posts.models import ImageBlob, Post
+from posts.storage import post_images
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+HOUR = 60 * 60
+
+
+def uploaded(name='small.gif', content=SMALL_GIF):
+    return SimpleUploadedFile(
+        name=name, content=content, content_type='image/gif')
+
+
+def age(path, seconds=2 * HOUR):
+    """Сдвигает дату изменения файла в прошлое."""
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class MediaGarbageCollectionTest(TestCase):
+    """Сборка мусора удаляет только файлы, на которые никто не ссылается."""
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    def setUp(self):
+        default.kvstore.clear()
+        cache.clear()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def thumbnail_paths(self, name):
+        kvstore = default.kvstore
+        source = ImageFile(name, post_images)
+        keys = kvstore._get(source.key, identity='thumbnails') or []
+        return [
+            default.storage.path(kvstore._get(key).name) for key in keys]
+
+    def orphan(self, content):
+        """Пост с картинкой, удалённый час назад: файл и миниатюры."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=uploaded(content=content))
+        name = post.image.name
+        thumbnails.generate(name)
+        paths = self.thumbnail_paths(name)
+        post.delete()
+        ImageBlob.objects.filter(name=name).update(
+            updated=ImageBlob.objects.get(name=name).updated
+            - timedelta(seconds=2 * HOUR))
+        for path in [post_images.path(name)] + paths:
+            age(path)
+        return name, paths
+
+    def test_collects_orphans_with_thumbnails(self):
+        name, paths = self.orphan(SMALL_GIF + b'\x01')
+        self.assertEqual(len(paths), len(thumbnails.SIZES))
+        kept = Post.objects.create(
+            author=self.user, text='Живой', image=uploaded())
+        thumbnails.generate(kept.image.name)
+        kept_thumbnails = self.thumbnail_paths(kept.image.name)
+        age(post_images.path(kept.image.name))
+        size = sum(os.path.getsize(path) for path in
+                   [post_images.path(name)] + paths)
+        report = media_gc.collect(grace=HOUR, batch_size=1)
+        self.assertEqual(report, {
+            'images': 1, 'thumbnails': len(paths), 'blobs': 1,
+            'bytes': size,
+        })
+        self.assertFalse(post_images.exists(name))
+        self.assertFalse(any(map(os.path.exists, paths)))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+        self.assertEqual(self.thumbnail_paths(name), [])
+        self.assertTrue(post_images.exists(kept.image.name))
+        self.assertTrue(all(map(os.path.exists, kept_thumbnails)))
+
+    def test_dry_run_deletes_nothing(self):
+        name, paths = self.orphan(SMALL_GIF + b'\x02')
+        report = media_gc.collect(grace=HOUR, dry_run=True)
+        self.assertEqual(report['images'], 1)
+        self.assertEqual(report['thumbnails'], len(paths))
+        self.assertTrue(post_images.exists(name))
+        self.assertTrue(all(map(os.path.exists, paths)))
+        self.assertEqual(media_gc.collect(grace=HOUR), report)
+
+    def test_grace_keeps_recent_files(self):
+        """Недавно сохранённый файл без ссылок не удаляется."""
+        name = post_images.save('posts/new.gif', ContentFile(b'new'))
+        self.assertEqual(media_gc.collect(grace=HOUR)['images'], 0)
+        age(post_images.path(name))
+        self.assertEqual(media_gc.collect(grace=HOUR)['images'], 1)
+
+    def test_reupload_touches_file(self):
+        """Повторная загрузка того же файла продлевает ему жизнь."""
+        name, _ = self.orphan(SMALL_GIF + b'\x03')
+        self.assertEqual(
+            post_images.save('posts/again.gif',
+                             ContentFile(SMALL_GIF + b'\x03')),
+            name)
+        self.assertEqual(media_gc.collect(grace=HOUR)['images'], 0)
+        self.assertTrue(post_images.exists(name))
+
+    def test_post_reference_without_blob_keeps_file(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=uploaded())
+        ImageBlob.objects.all().delete()
+        age(post_images.path(post.image.name))
+        self.assertEqual(media_gc.collect(grace=HOUR)['images'], 0)
+
+    def test_stray_thumbnail_is_collected(self):
+        path = default.storage.path('cache/ab/cd/stray.jpg')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as stray:
+            stray.write(b'x' * 10)
+        age(path)
+        report = media_gc.collect(grace=HOUR)
+        self.assertEqual((report['thumbnails'], report['bytes']), (1, 10))
+        self.assertFalse(os.path.exists(path))
+
+    def test_referenced_file_is_restored(self):
+        """Ссылка, появившаяся после переименования, возвращает файл."""
+        name = post_images.save('posts/file.gif', ContentFile(b'file'))
+        path = post_images.path(name)
+        age(path)
+        self.assertEqual(media_gc._remove(path, lambda: True, time.time()), 0)
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(path + media_gc.TOMBSTONE))
+
+    def test_command_reports_bytes(self):
+        self.orphan(SMALL_GIF + b'\x04')
+        out = StringIO()
+        call_command('collect_media', '--grace', str(HOUR), stdout=out)
+        self.assertIn('Удалено: картинок 1', out.getvalue())
+        self.assertIn('байт', out.getvalue())
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class NdjsonTest(TestCase):
+    """Выгрузка и загрузка данных в NDJSON."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-group', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост про борщ', group=cls.group)
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def export(self):
+        out = StringIO()
+        call_command('export_ndjson', '-', stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def tmp_file(self, content):
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.ndjson', delete=False) as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, stream.name)
+        return stream.name
+
+    def test_round_trip(self):
+        """Загруженные данные совпадают с выгруженными, даты не меняются."""
+        dump = self.export()
+        rows = [json.loads(line) for line in dump.splitlines()]
+        self.assertEqual(
+            [row['model'] for row in rows],
+            ['auth.user', 'auth.user', 'posts.group', 'posts.post',
+             'posts.comment', 'posts.follow'])
+        created = self.post.created
+        User.objects.all().delete()
+        Group.objects.all().delete()
+
+        path = self.tmp_file(dump)
+        out = StringIO()
+        call_command('import_ndjson', path, batch_size=1, stdout=out)
+        self.assertIn('posts.post: 1', out.getvalue())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.created, created)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.author.counter.followers_count, 1)
+        self.assertEqual(self.export(), dump.replace(
+            '"fanned_out": true', '"fanned_out": false'))
+        # Составные индексы построены заново
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(
+                cursor, Post._meta.db_table)
+        self.assertIn('post_created_idx', indexes)
+        response = self.client.get('/search/', {'q': 'борщ'})
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_unknown_model(self):
+        path = self.tmp_file(json.dumps(
+            {'model': 'admin.logentry', 'pk': 1, 'fields': {}}) + '\n')
+        with self.assertRaises(CommandError):
+            call_command('import_ndjson', path, stdout=StringIO())
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(
+                cursor, Post._meta.db_table)
+        self.assertIn('post_created_idx', indexes)
@@ -4,7 +4,9 @@ import tempfile
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from ..models import Group, Post
@@ -45,6 +47,9 @@ class PaginatorViewsTest(TestCase):
                                       group=cls.group)
                                       ])
 
+    def setUp(self):
+        cache.clear()
+
     def test_pages_contain_correct_records(self):
         """Проверка количества постов на первой и второй страницах."""
         paginator_pages = [
@@ -68,3 +73,42 @@ class PaginatorViewsTest(TestCase):
                     second_response.context['page_obj']),
                     COUNT_TEST_POSTS - NUMBER_OF_POSTS
                 )
+
+    def test_cursor_pages_contain_correct_records(self):
+        """Курсорная навигация проходит ленту без COUNT и OFFSET."""
+        paginator_pages = [
+            reverse('posts:index'),
+            reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            ),
+        ]
+        for url in paginator_pages:
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    first_response = self.post_author.get(url)
+                    first_page = first_response.context['page_obj']
+                    first_ids = [post.id for post in first_page]
+                self.assertFalse(any(
+                    'COUNT(' in query['sql'] or 'OFFSET' in query['sql']
+                    for query in queries.captured_queries
+                ))
+                self.assertIsNone(first_page.previous_cursor)
+                second_response = self.post_author.get(
+                    url, {'cursor': first_page.next_cursor})
+                second_page = second_response.context['page_obj']
+                self.assertEqual(len(second_page),
+                                 COUNT_TEST_POSTS - NUMBER_OF_POSTS)
+                self.assertIsNone(second_page.next_cursor)
+                back_response = self.post_author.get(
+                    url, {'cursor': second_page.previous_cursor})
+                self.assertEqual(
+                    [post.id for post in back_response.context['page_obj']],
+                    first_ids
+                )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдаёт первую страницу."""
+        response = self.post_author.get(
+            reverse('posts:index'), {'cursor': 'broken'})
+        self.assertEqual(len(response.context['page_obj']), NUMBER_OF_POSTS)
@@ -0,0 +1,97 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?P<table>\w+)\b(?! USING)')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+class QueryPlanTest(TestCase):
+    """Запросы лент не читают таблицы целиком и не сортируют в памяти.
+
+    Каждый SELECT, который выполняют view, прогоняется через
+    EXPLAIN QUERY PLAN SQLite. Читатель подписан и на автора, чьи
+    посты дочитываются лентой (не разосланы и старше окна подписки),
+    поэтому проверяются все запросы ленты подписок.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Тестовое описание',
+        )
+        cls.popular = User.objects.create_user(username='popular')
+        Follow.objects.create(user=cls.author, author=cls.popular)
+        for i in range(25):
+            Post.objects.create(author=cls.popular, text=f'Старый пост {i}')
+        Post.objects.bulk_create(
+            [Post(author=cls.popular, text='Не разосланный пост')])
+        Follow.objects.create(user=cls.reader, author=cls.popular)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(15):
+            post = Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.group)
+            Comment.objects.create(
+                post=post, author=cls.reader, text='Комментарий')
+        cls.post = post
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def plan_problems(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            details = [row[-1] for row in cursor.fetchall()]
+        problems = []
+        for detail in details:
+            match = FULL_SCAN.match(detail)
+            if match and match.group('table').startswith('posts_'):
+                problems.append(detail)
+            if TEMP_SORT in detail:
+                problems.append(detail)
+        return problems
+
+    def test_feed_queries_use_indexes(self):
+        """Для каждого запроса view есть подходящий индекс."""
+        first_page = self.reader_client.get(reverse('posts:index'))
+        next_cursor = first_page.context['page_obj'].next_cursor
+        follow_page = self.reader_client.get(reverse('posts:follow_index'))
+        follow_cursor = follow_page.context['page_obj'].next_cursor
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.popular,
+            backfill_created__isnull=False).exists())
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:index') + f'?cursor={next_cursor}',
+            reverse('posts:group_list', kwargs={'slug': 'test-group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+            reverse('posts:follow_index') + f'?cursor={follow_cursor}',
+            reverse('posts:profile_follow', kwargs={'username': 'author'}),
+        ]
+        for url in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.reader_client.get(url)
+            for query in queries.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                with self.subTest(url=url, sql=query['sql']):
+                    self.assertEqual(self.plan_problems(query['sql']), [])
@@ -0,0 +1,93 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    """Поиск по постам и комментариям."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.in_text = Post.objects.create(
+            author=cls.user, text='Рецепт борща со свёклой')
+        cls.in_comment = Post.objects.create(
+            author=cls.user, text='Что приготовить на обед?')
+        Comment.objects.create(
+            post=cls.in_comment, author=cls.user, text='Сварите борщ')
+        Post.objects.create(author=cls.user, text='Прогулка по парку')
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params})
+        return list(response.context['page_obj'])
+
+    def test_text_match_ranks_above_comment_match(self):
+        """Совпадение в тексте поста выше совпадения в комментарии."""
+        self.assertEqual(self.found('борщ'), [self.in_text, self.in_comment])
+
+    def test_query_is_not_fts_syntax(self):
+        """Операторы FTS5 в запросе не ломают поиск."""
+        self.assertEqual(self.found('"борщ" (*'), [
+            self.in_text, self.in_comment])
+        self.assertEqual(self.found(''), [])
+
+    def test_index_follows_changes(self):
+        """Правка и удаление поста и комментария обновляют индекс."""
+        post = Post.objects.create(author=self.user, text='Первый вариант')
+        self.assertEqual(self.found('вариант'), [post])
+        post.text = 'Исправленный текст'
+        post.save()
+        self.assertEqual(self.found('вариант'), [])
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Хороший вариант')
+        self.assertEqual(self.found('вариант'), [post])
+        comment.delete()
+        self.assertEqual(self.found('вариант'), [])
+        post.delete()
+        self.assertEqual(self.found('исправленный'), [])
+
+    def test_comment_indexed_without_post_row(self):
+        """Новый комментарий не пересобирает строку поста."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        with mock.patch.object(search, 'index_post') as index_post:
+            for i in range(3):
+                Comment.objects.create(
+                    post=post, author=self.user, text=f'Отзыв {i}')
+        index_post.assert_not_called()
+        self.assertEqual(self.found('отзыв'), [post])
+        self.assertEqual(
+            search.SearchResults('отзыв', Post.objects).count(), 1)
+
+    def test_pagination_keeps_query(self):
+        """Ссылки на страницы результатов сохраняют запрос."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Заметка {i}') for i in range(12))
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.found('заметка')), 10)
+        self.assertEqual(len(self.found('заметка', page=2)), 2)
+        response = self.client.get(reverse('posts:search'), {'q': 'заметка'})
+        self.assertContains(response, '?q=%D0%B7%D0%B0%D0%BC')
+
+    def test_rebuild_command(self):
+        """Команда заново индексирует все посты."""
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+        self.assertEqual(self.found('борщ'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Проиндексировано постов: 3', out.getvalue())
+        self.assertEqual(self.found('борщ'), [self.in_text, self.in_comment])
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from posts import blobs
+from posts.models import ImageBlob, Post
+from posts.storage import post_images
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+def uploaded(name='small.gif', content=SMALL_GIF):
+    return SimpleUploadedFile(
+        name=name, content=content, content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    """Одинаковые картинки хранятся одним файлом со счётчиком ссылок."""
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    def refs(self, name):
+        return ImageBlob.objects.get(name=name).refs
+
+    def test_same_content_same_file(self):
+        first = post_images.save('posts/a.gif', ContentFile(SMALL_GIF))
+        second = post_images.save('posts/b.GIF', ContentFile(SMALL_GIF))
+        other = post_images.save('posts/c.gif', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        directory = os.path.dirname(post_images.path(first))
+        self.assertEqual(os.listdir(directory), [os.path.basename(first)])
+        with post_images.open(first) as saved:
+            self.assertEqual(saved.read(), SMALL_GIF)
+
+    def test_reference_counting(self):
+        """Ссылки считаются при создании, замене и удалении картинки."""
+        first = Post.objects.create(
+            author=self.user, text='Первый', image=uploaded('one.gif'))
+        second = Post.objects.create(
+            author=self.user, text='Второй', image=uploaded('two.gif'))
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(self.refs(name), 2)
+        first.delete()
+        self.assertEqual(self.refs(name), 1)
+        second.image = uploaded('new.gif', SMALL_GIF + b'\x00')
+        second.save()
+        self.assertEqual(self.refs(name), 0)
+        self.assertEqual(self.refs(second.image.name), 1)
+        self.assertTrue(post_images.exists(name))
+
+    def test_recount(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=uploaded())
+        ImageBlob.objects.all().update(refs=5)
+        ImageBlob.objects.create(name='posts/lost.gif', refs=1)
+        self.assertEqual(blobs.recount(), 1)
+        self.assertEqual(self.refs(post.image.name), 1)
+        self.assertEqual(self.refs('posts/lost.gif'), 0)
@@ -0,0 +1,93 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+def uploaded(name='small.gif'):
+    return SimpleUploadedFile(
+        name=name, content=SMALL_GIF, content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailsTest(TestCase):
+    """Миниатюры готовятся до первого рендера страницы."""
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    def setUp(self):
+        # Одинаковые картинки хранятся одним файлом с общими миниатюрами,
+        # а ключи sorl кешируются и после отката транзакции теста
+        default.kvstore.clear()
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def ready_thumbnails(self, post):
+        image = ImageFile(post.image)
+        return default.kvstore._get(image.key, identity='thumbnails') or []
+
+    def test_submit_generates_every_template_size(self):
+        """Для картинки готовы все размеры, которые используют шаблоны."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=uploaded())
+        self.assertEqual(self.ready_thumbnails(post), [])
+        thumbnails.submit(post.image.name)
+        self.assertEqual(
+            len(self.ready_thumbnails(post)), len(thumbnails.SIZES))
+
+    def test_post_create_saves_image(self):
+        """Картинка из формы создания поста сохраняется."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': uploaded('new.gif')},
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertRegex(
+            post.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+
+    def test_backfill_command(self):
+        """Команда готовит миниатюры для уже загруженных картинок."""
+        posts = [
+            Post.objects.create(
+                author=self.user, text=f'Пост {i}',
+                image=uploaded(f'old_{i}.gif'))
+            for i in range(3)
+        ]
+        out = StringIO()
+        call_command('pregenerate_thumbnails', workers=0, stdout=out)
+        self.assertIn('Готово картинок: 3, с ошибками: 0', out.getvalue())
+        for post in posts:
+            self.assertEqual(
+                len(self.ready_thumbnails(post)), len(thumbnails.SIZES))
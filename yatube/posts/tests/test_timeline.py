@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    """Проверка материализованной ленты подписок."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed_ids(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return [post.id for post in response.context['page_obj']]
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Новый пост раскладывается в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.feed_ids(), [post.id])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка подтягивает старые посты, отписка их убирает."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}))
+        self.assertEqual(self.feed_ids(), [post.id])
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author'}))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertEqual(self.feed_ids(), [])
+
+    @override_settings(TIMELINE_BACKFILL_SIZE=3)
+    def test_follow_backfills_recent_window(self):
+        """В ленту копируются только новые посты, старые дочитываются."""
+        early = User.objects.create_user(username='early')
+        Follow.objects.create(user=early, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(8)
+        ]
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.reader).order_by(
+                'post_id').values_list('post_id', flat=True)),
+            [post.pk for post in posts[-3:]])
+        self.assertEqual(
+            self.feed_ids(), [post.pk for post in reversed(posts)])
+
+    def test_pages_merge_timeline_and_pulled_posts(self):
+        """Страницы по курсору сливают таймлайн и дочитанные посты."""
+        popular = User.objects.create_user(username='popular')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=popular)
+        for i in range(12):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            Post.objects.bulk_create([Post(author=popular, text=f'Пост {i}')])
+        expected = list(Post.objects.order_by(
+            '-created', '-pk').values_list('pk', flat=True))
+        url = reverse('posts:follow_index')
+        seen, pages, cursor = [], [], None
+        while True:
+            page = self.reader_client.get(
+                url, {'cursor': cursor} if cursor else {}
+            ).context['page_obj']
+            pages.append(page)
+            seen += [post.pk for post in page]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+        back = self.reader_client.get(
+            url, {'cursor': pages[2].previous_cursor}).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in back], [post.pk for post in pages[1]])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_read_on_demand(self):
+        """Посты популярного автора не рассылаются, а дочитываются."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        post.refresh_from_db()
+        self.assertFalse(post.fanned_out)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_ids(), [post.id])
+
+    def test_bulk_created_posts_are_visible(self):
+        """Посты, созданные в обход сигналов, тоже видны в ленте."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.bulk_create([Post(author=self.author, text='Пост')])
+        self.assertEqual(len(self.feed_ids()), 1)
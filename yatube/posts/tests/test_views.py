@@ -1,15 +1,21 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
+from django.utils.http import http_date
 
-from ..models import Comment, Group, Post
+from .. import caching, cards
+from ..models import Comment, Follow, Group, Post
+from ..utils import NUMBER_OF_COMMENTS
 
 User = get_user_model()
 
@@ -227,23 +233,45 @@ class PostURLTests(TestCase):
         self.assertEqual(text, self.comment.text)
 
     def test_cache_index(self):
-        """Главная страница работает с 20 секундным кешем."""
-        self.authorized_user.get(
-            reverse('posts:index'))
+        """Главная страница кешируется до изменения постов."""
+        response1 = self.guest_client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            response2 = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response1.content, response2.content)
         Post.objects.create(
             author=self.user,
             text='текст 1',
             group=self.group)
-        response1 = self.authorized_user.get(
-            reverse('posts:index'))
-        Post.objects.all().delete()
-        response2 = self.authorized_user.get(
-            reverse('posts:index'))
-        self.assertEqual(response1.content, response2.content)
-        cache.clear()
-        response3 = self.authorized_user.get(
-            reverse('posts:index'))
+        response3 = self.guest_client.get(reverse('posts:index'))
         self.assertNotEqual(response1.content, response3.content)
+        self.assertContains(response3, 'текст 1')
+        Post.objects.filter(text='текст 1').delete()
+        response4 = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response4, 'текст 1')
+
+    def test_cache_post_detail_comment(self):
+        """Новый комментарий сбрасывает кеш страницы поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.guest_client.get(url)
+        Comment.objects.create(
+            post=self.post,
+            author=self.user,
+            text='Свежий комментарий',
+        )
+        self.assertContains(self.guest_client.get(url), 'Свежий комментарий')
+
+    def test_page_cache_is_not_shared_between_users(self):
+        """Кеш страниц не отдаёт одному пользователю страницу другого."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        other = Client()
+        other.force_login(User.objects.create_user(username='other_user'))
+        self.guest_client.get(url)
+        self.assertNotContains(self.guest_client.get(url), 'csrfmiddleware')
+        other.get(url)
+        response = self.authorized_user.get(url)
+        self.assertContains(response, 'Пользователь: test_user')
+        self.assertNotContains(response, 'other_user')
+        self.assertContains(response, 'csrfmiddlewaretoken')
 
     def test_authorized_user_follow(self):
         """Тестирование подписки на автора"""
@@ -291,3 +319,258 @@ class PostURLTests(TestCase):
         response = self.authorized_user.get(reverse('posts:follow_index'))
         self.assertEqual(
             response.context.get('page_obj').object_list.count(), 0)
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов на страницу ленты не зависит от числа постов."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Тестовое описание',
+        )
+        for i in range(COUNT_TEST_POSTS):
+            author = User.objects.create_user(username=f'author_{i}')
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                author=author, text=f'Тестовый пост {i}', group=cls.group)
+            Comment.objects.create(
+                post=post, author=author, text='Тестовый комментарий')
+        cls.post = post
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def test_feed_query_count(self):
+        """Авторы, группы и комментарии не догружаются по одному."""
+        pages = (
+            (self.guest_client, reverse('posts:index'), 2),
+            (self.guest_client, reverse(
+                'posts:group_list', kwargs={'slug': 'test-group'}), 3),
+            (self.guest_client, reverse(
+                'posts:profile', kwargs={'username': 'author_0'}), 3),
+            (self.guest_client, reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.id}), 2),
+            (self.reader_client, reverse('posts:follow_index'), 5),
+        )
+        for client, url, queries in pages:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    client.get(url)
+
+
+class ConditionalGetTest(TestCase):
+    """Ленты отвечают 304, пока их данные не изменились."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Тестовое описание',
+        )
+        Post.objects.create(
+            author=cls.author, text='Тестовый пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ]
+
+    def test_not_modified_without_queries(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_user(self):
+        """Шапка страницы своя у каждого пользователя."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_changes_refresh_etag(self):
+        etags = {url: self.reader_client.get(url)['ETag'] for url in self.urls}
+        Post.objects.create(
+            author=self.author, text='Новый пост', group=self.group)
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Новый пост')
+        profile = self.urls[2]
+        etag = self.reader_client.get(profile)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(profile, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since_alone_is_not_trusted(self):
+        """Правка и удаление поста видны клиенту с If-Modified-Since."""
+        old = Post.objects.create(author=self.author, text='Старый пост')
+        newest = Post.objects.create(author=self.author, text='Новый пост')
+        url = reverse('posts:index')
+        response = self.guest_client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        since = http_date()
+        old.text = 'Исправленный пост'
+        old.save()
+        response = self.guest_client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertContains(response, 'Исправленный пост')
+        newest.delete()
+        response = self.guest_client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertNotContains(response, 'Новый пост')
+
+
+class CommentPaginationTest(TestCase):
+    """Комментарии на странице поста выводятся порциями."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        for i in range(NUMBER_OF_COMMENTS + 5):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_comments_are_loaded_in_batches(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        first = self.texts(response.context['comments'])
+        self.assertEqual(first[0], f'Комментарий {NUMBER_OF_COMMENTS + 4}')
+        self.assertEqual(len(first), NUMBER_OF_COMMENTS)
+        cursor = response.context['comments_next_cursor']
+        more_url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.id})
+        self.assertContains(response, f'{more_url}?cursor={cursor}')
+
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                more_url, {'cursor': cursor},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertTemplateUsed(
+            response, 'posts/includes/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        rest = self.texts(response.context['comments'])
+        self.assertEqual(rest, [f'Комментарий {i}' for i in range(4, -1, -1)])
+        self.assertIsNone(response.context['comments_next_cursor'])
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_comments_page_without_script(self):
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}))
+        self.assertTemplateUsed(response, 'posts/comments.html')
+        self.assertEqual(
+            len(response.context['comments']), NUMBER_OF_COMMENTS)
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertIn('X-Requested-With', response['Vary'])
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}))
+        self.assertContains(response, '<html')
+        missing = reverse('posts:post_comments', kwargs={'post_id': 999})
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+
+class PostCardCacheTest(TestCase):
+    """Проверка кеша карточек постов."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.user, text='Карточка')
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+        cards.reset_stats()
+
+    def test_card_is_rendered_once(self):
+        """Карточка рендерится один раз и обновляется после правки."""
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.guest_client.get(url)
+        self.assertEqual(cards.stats(), (0, 1))
+        caching.bump(caching.profile_scope('author'))
+        self.guest_client.get(url)
+        self.assertEqual(cards.stats(), (1, 1))
+        self.post.text = 'Новый текст карточки'
+        self.post.save()
+        self.assertContains(self.guest_client.get(url), 'Новый текст')
+        self.assertEqual(cards.stats(), (1, 2))
+
+    def test_card_follows_author_and_group(self):
+        """Новое имя автора и адрес группы попадают в карточку."""
+        group = Group.objects.create(title='Группа', slug='old-slug')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        post = Post.objects.for_feed().get(pk=self.post.pk)
+        cards.get_cards([post])
+        self.user.first_name = 'Новое'
+        self.user.save()
+        group.slug = 'new-slug'
+        group.save()
+        post = Post.objects.for_feed().get(pk=self.post.pk)
+        html = cards.get_cards([post])[cards.card_key(post)]
+        self.assertIn('Новое', html)
+        self.assertIn('new-slug', html)
+
+    def test_stats_are_flushed_periodically(self):
+        """Счётчики не пишутся в общий кеш на каждый рендер."""
+        post = Post.objects.for_feed().get(pk=self.post.pk)
+        with mock.patch.object(cards.cache, 'incr') as incr:
+            cards.get_cards([post])
+            cards.get_cards([post])
+        incr.assert_not_called()
+        self.assertEqual(cards.stats(), (1, 1))
+        with mock.patch.object(cards, 'STATS_FLUSH_INTERVAL', 0):
+            cards.get_cards([post])
+        self.assertEqual(cache.get(cards.HITS_KEY), 2)
+
+
+class GenerationAfterCommitTest(TransactionTestCase):
+    """Поколение кеша меняется и после коммита записи."""
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+        self.client = Client()
+
+    def test_version_changes_again_on_commit(self):
+        """Страница, закешированная читателем до коммита, не читается."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        before = caching.get_version(caching.INDEX)
+        with transaction.atomic():
+            Post.objects.create(author=self.user, text='Новый пост')
+            during = caching.get_version(caching.INDEX)
+        self.assertGreater(during, before)
+        self.assertGreater(caching.get_version(caching.INDEX), during)
+        self.assertContains(self.client.get(url), 'Новый пост')
@@ -0,0 +1,111 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts import writebuffer
+from posts.models import Comment, Follow, Post
+from posts.search import SearchResults
+
+User = get_user_model()
+
+
+@override_settings(
+    WRITE_BUFFER_ENABLED=True, WRITE_BUFFER_MAX_ITEMS=100,
+    WRITE_BUFFER_MAX_DELAY=0.05)
+class WriteBufferTest(TransactionTestCase):
+    """Комментарии и подписки записываются пачками."""
+
+    def setUp(self):
+        writebuffer.reset()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        writebuffer.reset()
+
+    def test_concurrent_comments_written_in_one_batch(self):
+        """Комментарии из разных потоков ложатся одной пачкой."""
+        results = []
+        original = writebuffer.write
+
+        def save(i):
+            try:
+                results.append(writebuffer.save(Comment(
+                    post=self.post, author=self.reader, text=f'Текст {i}')))
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(
+                writebuffer, 'write', side_effect=original) as write:
+            threads = [
+                threading.Thread(target=save, args=(i,)) for i in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(results, [True] * 10)
+        self.assertLessEqual(write.call_count, 2)
+        self.assertEqual(Comment.objects.count(), 10)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 10)
+
+    def test_comment_visible_after_redirect(self):
+        """После ответа на POST комментарий уже на странице поста."""
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Свой комментарий'})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(response.url)
+        self.assertContains(response, 'Свой комментарий')
+
+    def test_batch_comments_get_ids_and_index_rows(self):
+        """Комментарии пачки получают id и свои строки поиска."""
+        first, second = writebuffer.write([
+            Comment(post=self.post, author=self.reader, text='Первый отзыв'),
+            Comment(post=self.post, author=self.reader, text='Второй отзыв'),
+        ])
+        self.assertEqual(
+            [first.pk, second.pk],
+            list(Comment.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(Comment.objects.get(pk=first.pk).text, 'Первый отзыв')
+        first.delete()
+        posts = Post.objects.all()
+        self.assertEqual(list(SearchResults('первый', posts)[0:10]), [])
+        self.assertEqual(list(SearchResults('второй', posts)[0:10]), [
+            self.post])
+
+    def test_duplicate_follows_skipped(self):
+        """Повторная подписка в пачке и в базе не записывается."""
+        self.assertTrue(writebuffer.save(
+            Follow(user=self.reader, author=self.author)))
+        self.assertFalse(writebuffer.save(
+            Follow(user=self.reader, author=self.author)))
+        self.client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).counter.followers_count, 1)
+
+    def test_batch_error_reaches_request(self):
+        """Ошибка записи пачки получает каждый её запрос."""
+        with mock.patch.object(
+                writebuffer, 'write', side_effect=DatabaseError('locked')):
+            with self.assertRaises(DatabaseError):
+                writebuffer.save(Comment(
+                    post=self.post, author=self.reader, text='Текст'))
+        self.assertFalse(Comment.objects.exists())
+
+    @override_settings(WRITE_BUFFER_ENABLED=False)
+    def test_disabled_buffer_saves_directly(self):
+        """Выключенный буфер пишет обычным save() без потоков."""
+        writebuffer.save(Comment(
+            post=self.post, author=self.reader, text='Текст'))
+        self.assertIsNone(writebuffer._buffer)
+        self.assertEqual(Comment.objects.count(), 1)
@@ -0,0 +1,97 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+sorl-thumbnail режет картинку при первом рендере {% thumbnail %}, и эту
+работу оплачивает первый же запрос к странице с новым постом, а
+одновременные запросы делают её повторно. Здесь все размеры, которые
+используют шаблоны, готовятся сразу после загрузки в пуле потоков.
+Шаблон потом находит готовую миниатюру в хранилище ключей sorl и
+только подставляет её адрес.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from posts.storage import post_images
+
+logger = logging.getLogger(__name__)
+
+# Размеры и параметры должны совпадать с тегами {% thumbnail %} в шаблонах,
+# иначе sorl посчитает другой ключ и снова порежет картинку при рендере.
+SIZES = (
+    # posts/includes/post_list.html
+    ('960x339', {'crop': '30%', 'upscale': True}),
+    # posts/post_detail.html
+    ('666x646', {'crop': 'center', 'upscale': True}),
+)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def generate(image):
+    """Готовит все миниатюры картинки (файла или имени в хранилище)."""
+    if isinstance(image, str):
+        # Ключ миниатюры в sorl включает хранилище: по имени картинка
+        # ищется в хранилище постов, как у {% thumbnail post.image %}.
+        image = ImageFile(image, post_images)
+    for geometry, options in SIZES:
+        get_thumbnail(image, geometry, **options)
+
+
+def generate_logged(name):
+    """То же, что generate, но ошибка только пишется в лог."""
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры %s', name)
+        return False
+    return True
+
+
+def _work(name):
+    try:
+        generate_logged(name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        # У потока пула свои соединения с базой, закрываем их сами.
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def submit(name):
+    """Отдаёт картинку пулу, если она ещё не в очереди.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры готовятся сразу в текущем потоке.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        generate_logged(name)
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    _get_executor().submit(_work, name)
+
+
+def schedule(image):
+    """Ставит картинку поста в очередь после коммита транзакции."""
+    if image:
+        name = image.name
+        transaction.on_commit(lambda: submit(name))
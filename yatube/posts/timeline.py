@@ -0,0 +1,168 @@
+"""Лента подписок: fan-out-on-write с откатом на fan-out-on-read.
+
+Новый пост автора раскладывается в TimelineEntry каждого подписчика.
+Если подписчиков не меньше TIMELINE_FANOUT_LIMIT, пост не рассылается
+(fanned_out остаётся False), и лента подмешивает такие посты сама
+при чтении. Поэтому один пост никогда не вызывает неограниченную
+серию вставок, а посты, созданные в обход сигналов (bulk_create),
+всё равно видны подписчикам.
+
+При подписке в ленту копируются только TIMELINE_BACKFILL_SIZE новых
+постов автора, а ключ самого старого из них запоминается в Follow:
+посты старше него лента тоже дочитывает сама.
+
+Страница ленты собирается из ключей (created, id): до per_page + 1
+ключей из таймлайна по индексу (user, created, post) и столько же
+из постов каждого автора, чьи посты дочитываются, по индексам
+(author, created, id). Списки сливаются в Python, сами посты страницы
+читаются одним запросом по первичному ключу.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Follow, Post, TimelineEntry
+from .utils import NEXT, NUMBER_OF_POSTS, KeysetPaginator, decode_cursor
+
+BATCH_SIZE = 500
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    followers = Follow.objects.filter(author_id=post.author_id)
+    if followers.count() >= settings.TIMELINE_FANOUT_LIMIT:
+        return
+    entries = (
+        TimelineEntry(user_id=user_id, post_id=post.pk, created=post.created)
+        for user_id in followers.values_list('user_id', flat=True)
+    )
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    Post.objects.filter(pk=post.pk).update(fanned_out=True)
+
+
+def backfill(user_id, author_id):
+    """Копирует в ленту нового подписчика последние разосланные посты.
+
+    Подписка стоит одного чтения и одной вставки, сколько бы постов ни
+    было у автора. Если скопированы не все, ключ самого старого из них
+    запоминается в подписке.
+    """
+    size = settings.TIMELINE_BACKFILL_SIZE
+    keys = list(Post.objects.filter(
+        author_id=author_id, fanned_out=True,
+    ).order_by('-created', '-pk').values_list('created', 'pk')[:size + 1])
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, created=created)
+         for created, pk in keys[:size]),
+        ignore_conflicts=True,
+    )
+    if len(keys) > size:
+        created, pk = keys[size - 1]
+        Follow.objects.filter(user_id=user_id, author_id=author_id).update(
+            backfill_created=created, backfill_pk=pk)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора, от которого отписались."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def _older(queryset, key, pk_field='pk'):
+    created, pk = key
+    return queryset.filter(created__lte=created).exclude(
+        **{'created': created, f'{pk_field}__gte': pk})
+
+
+def _newer(queryset, key, pk_field='pk'):
+    created, pk = key
+    return queryset.filter(created__gte=created).exclude(
+        **{'created': created, f'{pk_field}__lte': pk})
+
+
+class TimelinePaginator(KeysetPaginator):
+    """KeysetPaginator ленты подписок user.
+
+    object_list - посты, из которых читаются строки страницы. Старые
+    ссылки ?page=N лента не поддерживает: страницы только по курсору.
+    """
+
+    def __init__(self, user, object_list, per_page, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.user = user
+
+    def _sources(self):
+        """Запросы ключей: таймлайн и посты, которые дочитываются."""
+        yield TimelineEntry.objects.filter(user=self.user), 'post_id'
+        unfanned = Post.objects.filter(
+            author_id=OuterRef('author_id'), fanned_out=False)
+        follows = Follow.objects.filter(user=self.user).annotate(
+            unfanned=Exists(unfanned),
+        ).filter(
+            Q(unfanned=True) | Q(backfill_created__isnull=False),
+        ).values_list(
+            'author_id', 'unfanned', 'backfill_created', 'backfill_pk')
+        for author_id, has_unfanned, created, pk in follows:
+            posts = Post.objects.filter(author_id=author_id)
+            if has_unfanned:
+                yield posts.filter(fanned_out=False), 'pk'
+            if created is not None:
+                older = _older(posts.filter(fanned_out=True), (created, pk))
+                yield older, 'pk'
+
+    def _keys(self, bound=None, newer=False):
+        """До per_page + 1 ключей ленты за ключом bound.
+
+        От новых к старым, с newer - от старых к новым.
+        """
+        limit = self.per_page + 1
+        lists = []
+        for queryset, pk_field in self._sources():
+            if bound is not None:
+                queryset = (_newer if newer else _older)(
+                    queryset, bound, pk_field)
+            order = ('created', pk_field) if newer else (
+                '-created', f'-{pk_field}')
+            lists.append(list(queryset.order_by(*order).values_list(
+                'created', pk_field)[:limit]))
+        keys = []
+        for key in heapq.merge(*lists, reverse=not newer):
+            if not keys or keys[-1] != key:
+                keys.append(key)
+            if len(keys) == limit:
+                break
+        return keys
+
+    def get_cursor_page(self, token):
+        cursor = decode_cursor(token) if token else None
+        if cursor is None:
+            return self._page_for_keys(self._keys(), anchored=False)
+        direction, created, pk = cursor
+        if direction == NEXT:
+            return self._page_for_keys(
+                self._keys((created, pk)), anchored=True)
+        keys = self._keys((created, pk), newer=True)
+        if len(keys) <= self.per_page:
+            # До начала ленты меньше страницы: отдаём первую страницу.
+            return self._page_for_keys(self._keys(), anchored=False)
+        return self._page_for_keys(
+            keys[self.per_page - 1::-1], anchored=True,
+            has_previous=True, has_next=True)
+
+    def _rows(self, page_keys):
+        # Порядок страницы уже известен по ключам: в базе посты читаются
+        # по первичному ключу без сортировки. object_list может быть и
+        # values() со словарями (JSON-лента).
+        ids = [pk for _, pk in page_keys]
+        position = {pk: index for index, pk in enumerate(ids)}
+        rows = self.object_list.filter(pk__in=ids).order_by()
+        return sorted(rows, key=lambda row: position[
+            row['pk'] if isinstance(row, dict) else row.pk])
+
+
+def get_page(request, posts):
+    """Страница ленты подписок пользователя запроса по ?cursor=."""
+    paginator = TimelinePaginator(request.user, posts, NUMBER_OF_POSTS)
+    return paginator.get_cursor_page(request.GET.get('cursor'))
@@ -1,11 +1,175 @@
+import hashlib
+
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from posts.models import Comment
 
 # Количество постов отображаемых на странице
 NUMBER_OF_POSTS: int = 10
+# Количество комментариев в одной порции на странице поста
+NUMBER_OF_COMMENTS: int = 20
+# Сколько секунд живёт оценка общего количества записей
+ESTIMATE_COUNT_TIMEOUT: int = 60
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, created, pk):
+    """Упаковывает ключ (created, id) в непрозрачный токен."""
+    raw = f'{direction}|{created.isoformat()}|{pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(token):
+    """Распаковывает токен. Для битого токена возвращает None."""
+    try:
+        direction, created, pk = force_str(
+            urlsafe_base64_decode(token)).split('|')
+        created = parse_datetime(created)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or created is None:
+        return None
+    return direction, created, pk
+
+
+class KeysetPaginator(Paginator):
+    """Паджинатор по ключу (created, id): без COUNT и без OFFSET.
+
+    Страница выбирается относительно ключа соседней записи, поэтому
+    глубокие страницы стоят столько же, сколько первая.
+    """
+
+    def __init__(self, object_list, per_page, estimate_count=False,
+                 count=None, **kwargs):
+        super().__init__(
+            object_list.order_by('-created', '-pk'), per_page, **kwargs)
+        self.estimate_count = estimate_count
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        """Известное заранее количество, точное или закешированная оценка."""
+        if self.known_count is not None:
+            return self.known_count
+        if not self.estimate_count:
+            return self.object_list.count()
+        key = 'paginator_count:' + hashlib.md5(
+            force_bytes(str(self.object_list.query))).hexdigest()
+        return cache.get_or_set(
+            key, self.object_list.count, ESTIMATE_COUNT_TIMEOUT)
 
+    def get_cursor_page(self, token):
+        """Возвращает страницу для токена, битый токен — первая страница."""
+        cursor = decode_cursor(token) if token else None
+        if cursor is None:
+            return self._keyset_page(self.object_list, anchored=False)
+        direction, created, pk = cursor
+        if direction == NEXT:
+            older = self.object_list.filter(created__lte=created).exclude(
+                created=created, pk__gte=pk)
+            return self._keyset_page(older, anchored=True)
+        newer = self.object_list.filter(created__gte=created).exclude(
+            created=created, pk__lte=pk).order_by('created', 'pk')
+        keys = list(newer.values_list('created', 'pk')[:self.per_page + 1])
+        if len(keys) <= self.per_page:
+            # До начала ленты меньше страницы: отдаём первую страницу.
+            return self._keyset_page(self.object_list, anchored=False)
+        first_created, first_pk = keys[self.per_page - 1]
+        window = self.object_list.filter(created__lte=first_created).exclude(
+            created=first_created, pk__gt=first_pk)
+        return self._keyset_page(window, anchored=True, has_previous=True)
 
-def get_page(request, posts):
-    """Шаблон Paginator."""
-    paginator = Paginator(posts, NUMBER_OF_POSTS)
+    def _keyset_page(self, queryset, anchored, has_previous=None):
+        """Собирает страницу из не более чем per_page записей queryset."""
+        keys = list(queryset.values_list('created', 'pk')[:self.per_page + 1])
+        return self._page_for_keys(keys, anchored, has_previous)
+
+    def _rows(self, page_keys):
+        """Записи страницы по ключам её первой и последней записи."""
+        first_created, first_pk = page_keys[0]
+        last_created, last_pk = page_keys[-1]
+        return self.object_list.filter(
+            created__lte=first_created, created__gte=last_created,
+        ).exclude(
+            created=first_created, pk__gt=first_pk,
+        ).exclude(
+            created=last_created, pk__lt=last_pk,
+        )
+
+    def _page_for_keys(self, keys, anchored, has_previous=None,
+                       has_next=None):
+        """Страница из ключей (created, id): per_page и, если есть, ещё один.
+
+        Лишний ключ означает, что за страницей есть следующая, если
+        has_next не сказал об этом явно.
+        """
+        page_keys = keys[:self.per_page]
+        if page_keys:
+            first_created, first_pk = page_keys[0]
+            last_created, last_pk = page_keys[-1]
+            object_list = self._rows(page_keys)
+        else:
+            object_list = self.object_list.none()
+        page = self._get_page(object_list, 1 if not anchored else None, self)
+        page.is_keyset = True
+        page.next_cursor = None
+        page.previous_cursor = None
+        if has_next is None:
+            has_next = len(keys) > self.per_page
+        if has_next and page_keys:
+            page.next_cursor = encode_cursor(NEXT, last_created, last_pk)
+        if has_previous is None:
+            has_previous = anchored
+        if has_previous and page_keys:
+            page.previous_cursor = encode_cursor(
+                PREVIOUS, first_created, first_pk)
+        return page
+
+
+def get_page(request, posts, estimate_count=False, count=None):
+    """Шаблон Paginator.
+
+    Основная навигация идёт по курсору ?cursor=..., старые ссылки
+    вида ?page=N продолжают работать через обычный OFFSET.
+    Если общее количество уже известно (счётчик), его передают в count.
+    """
+    paginator = KeysetPaginator(
+        posts, NUMBER_OF_POSTS, estimate_count=estimate_count, count=count)
+    return paginate(request, paginator)
+
+
+def paginate(request, paginator):
+    """Страница KeysetPaginator по параметрам ?page= или ?cursor=."""
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number is not None:
+        return paginator.get_page(page_number)
+    return paginator.get_cursor_page(request.GET.get('cursor'))
+
+
+def get_comments(post_id, token=None, per_page=NUMBER_OF_COMMENTS):
+    """Порция комментариев поста, новые первыми, и курсор следующей.
+
+    Комментарии только догружаются вперёд, поэтому порция читается одним
+    запросом по индексу (post, created, id) вместе с авторами.
+    """
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author').order_by('-created', '-pk')
+    cursor = decode_cursor(token) if token else None
+    if cursor is not None and cursor[0] == NEXT:
+        _, created, pk = cursor
+        comments = comments.filter(created__lte=created).exclude(
+            created=created, pk__gte=pk)
+    batch = list(comments[:per_page + 1])
+    next_cursor = None
+    if len(batch) > per_page:
+        last = batch[per_page - 1]
+        next_cursor = encode_cursor(NEXT, last.created, last.pk)
+    return batch[:per_page], next_cursor
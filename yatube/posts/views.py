@@ -1,19 +1,28 @@
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-from posts.utils import get_page
+from django.utils.cache import patch_vary_headers
+from core.replicas import read_replica
+from posts import (caching, conditional, groupfeed, thumbnails, timeline,
+                   writebuffer)
+from posts.counters import for_user
+from posts.search import SearchResults
+from posts.utils import get_comments, get_page
 
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Follow, Post, User
 
 NUMBER_OF_POSTS = 10
 
 
+@conditional.conditional(conditional.group_posts, per_user=True)
+@caching.cache_versioned(caching.group_scope)
+@read_replica(caching.written_recently(conditional.group_posts))
 def group_posts(request, slug):
     """ Страница со списком постов."""
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = get_page(request, posts)
+    group, page_obj = groupfeed.get_page(request, slug)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -21,53 +30,89 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
-@cache_page(20, key_prefix='index_page')
+@conditional.conditional(conditional.index_posts, per_user=True)
+@caching.cache_versioned(lambda: caching.INDEX)
+@read_replica(caching.written_recently(conditional.index_posts))
 def index(request):
     """Главная страница."""
-    posts = Post.objects.all()
+    posts = Post.objects.for_feed()
     page_obj = get_page(request, posts)
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'cache_version': caching.get_version(caching.INDEX),
+        'index': True,
     }
     return render(request, 'posts/index.html', context)
 
 
+@caching.cache_versioned(caching.post_scope)
+@read_replica(caching.written_recently(conditional.post_posts))
 def post_detail(request, post_id):
     """Детали по посту."""
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__counter'),
+        pk=post_id)
     form = CommentForm()
-    comments = post.comments.all()
+    comments, next_cursor = get_comments(post.pk)
     context = {
         'posts': post,
+        'author_counter': for_user(post.author),
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'comments_next_cursor': next_cursor,
     }
     return render(request, template, context)
 
 
+def comments_variant(request):
+    return 'fragment' if request.is_ajax() else 'page'
+
+
+@caching.cache_versioned(caching.post_scope, variant=comments_variant)
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста."""
+    post = get_object_or_404(Post.objects.only('pk', 'text'), pk=post_id)
+    comments, next_cursor = get_comments(post.pk, request.GET.get('cursor'))
+    context = {
+        'posts': post,
+        'comments': comments,
+        'comments_next_cursor': next_cursor,
+    }
+    # Кнопка «Показать ещё» на странице поста просит только сами
+    # комментарии, переход по ссылке без скрипта - целую страницу.
+    if request.is_ajax():
+        response = render(
+            request, 'posts/includes/comment_list.html', context)
+    else:
+        response = render(request, 'posts/comments.html', context)
+    patch_vary_headers(response, ['X-Requested-With'])
+    return response
+
+
 @login_required
 def add_comment(request, post_id):
     """ Функцию для обработки отправленного комментария."""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        writebuffer.save(comment)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def post_create(request):
     """Создание нового поста."""
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == 'POST':
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            thumbnails.schedule(post.image)
             return redirect('posts:profile', post.author)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -84,6 +129,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post.image)
         return redirect('posts:post_detail', post_id=post.id)
     context = {
         'form': form,
@@ -93,31 +140,37 @@ def post_edit(request, post_id):
     return render(request, template, context)
 
 
+@conditional.conditional(conditional.profile_posts, per_user=True)
+@caching.cache_versioned(caching.profile_scope)
+@read_replica(caching.written_recently(conditional.profile_posts))
 def profile(request, username):
     """ Профиль автора."""
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('group')
-    page_obj = get_page(request, post_list)
+    author = get_object_or_404(
+        User.objects.select_related('counter'), username=username)
+    counter = for_user(author)
+    post_list = author.posts.for_feed()
+    page_obj = get_page(request, post_list, count=counter.posts_count)
     following = False
     if request.user.is_authenticated:
-        following = request.user.follower.filter(
-            author=User.objects.get(username=author)).count()
+        following = request.user.follower.filter(author=author).exists()
     context = {'author': author,
                'page_obj': page_obj,
-               'posts_count': post_list.count,
+               'posts_count': counter.posts_count,
+               'counter': counter,
                'following': following,
                }
     return render(request, 'posts/profile.html', context)
 
 
 @login_required
+@read_replica(caching.written_recently(conditional.follow_posts))
 def follow_index(request):
     """ Информация о текущем пользователе."""
     user = request.user
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_page(request, post_list)
+    page_obj = timeline.get_page(request, Post.objects.for_feed())
     context = {'username': user,
                'page_obj': page_obj,
+               'follow': True,
                }
     return render(request, 'posts/follow.html', context)
 
@@ -128,7 +181,7 @@ def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
     if user != author:
-        Follow.objects.get_or_create(user=user, author=author)
+        writebuffer.save(Follow(user=user, author=author))
     return redirect('posts:profile', username=username)
 
 
@@ -144,3 +197,17 @@ def profile_unfollow(request, username):
     )
     follow_to_delete.delete()
     return redirect('posts:profile', username=username)
+
+
+def search(request):
+    """ Поиск по тексту постов и комментариев."""
+    query = request.GET.get('q', '').strip()
+    results = SearchResults(query, Post.objects.for_feed())
+    page_obj = Paginator(results, NUMBER_OF_POSTS).get_page(
+        request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
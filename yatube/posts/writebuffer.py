@@ -0,0 +1,176 @@
+"""Буфер записи комментариев и подписок (групповой коммит).
+
+SQLite пропускает одну пишущую транзакцию за раз. При всплеске
+комментариев к популярному посту каждый INSERT ждёт своей очереди на
+блокировку и fsync, и запросы упираются в таймаут. Буфер собирает
+вставки из всех потоков процесса и записывает их одной транзакцией
+bulk_create: когда набралось WRITE_BUFFER_MAX_ITEMS записей или прошло
+WRITE_BUFFER_MAX_DELAY секунд с первой из них.
+
+Гарантии:
+
+* Запрос, отдавший запись в буфер, ждёт коммита её пачки и только
+  потом отвечает. Ответ 302 означает, что запись уже в базе: после
+  сбоя процесса теряются лишь записи, о которых клиенту ещё ничего не
+  сообщили.
+* Поэтому пользователь видит свою запись на следующей же странице с
+  любого воркера: счётчики, поиск и поколения кеша обновляются в той
+  же пачке, до ответа.
+* Если пачка не записалась, ошибку получает каждый её запрос. Подписка,
+  которая уже есть в базе или повторяется в пачке, пропускается.
+
+Буфер включается настройкой WRITE_BUFFER_ENABLED; выключенный не
+создаёт потоков, и запись идёт обычным save().
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from posts.models import Comment, Follow
+from posts.signals import comments_added, follows_added
+
+# Сколько секунд запрос ждёт коммита своей пачки
+WAIT_TIMEOUT = 30
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+class WriteBuffer:
+    """Очередь вставок и поток, который записывает их пачками."""
+
+    def __init__(self, max_items, max_delay):
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self._pending = []
+        self._first_at = None
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, obj):
+        """Ставит Comment или Follow в очередь. Возвращает Future."""
+        future = Future()
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='write-buffer', daemon=True)
+                self._thread.start()
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.append((obj, future))
+            self._condition.notify()
+        return future
+
+    def _take(self):
+        """Ждёт заполнения пачки или истечения задержки и забирает её."""
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            deadline = self._first_at + self.max_delay
+            while len(self._pending) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch, self._pending = self._pending, []
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            # Соединение потока живёт между пачками: сбрасываем его,
+            # только если оно сломалось.
+            close_old_connections()
+            try:
+                written = {id(obj) for obj in write(
+                    [obj for obj, _ in batch])}
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+            else:
+                for obj, future in batch:
+                    future.set_result(id(obj) in written)
+
+
+def _new_follows(follows):
+    """Подписки, которых ещё нет ни в базе, ни раньше в этой пачке."""
+    pairs = Q()
+    for follow in follows:
+        pairs |= Q(user_id=follow.user_id, author_id=follow.author_id)
+    seen = set(Follow.objects.filter(pairs).values_list('user', 'author'))
+    new = []
+    for follow in follows:
+        pair = (follow.user_id, follow.author_id)
+        if pair not in seen:
+            seen.add(pair)
+            new.append(follow)
+    return new
+
+
+def _assign_ids(comments):
+    """Проставляет id комментариям после bulk_create.
+
+    В Django 2.2 bulk_create на SQLite не возвращает id. Пишущая
+    транзакция держит блокировку с первой вставки до коммита, а id с
+    AUTOINCREMENT выдаются подряд, поэтому последние len(comments) id -
+    это пачка в порядке вставки.
+    """
+    ids = list(Comment.objects.order_by('-pk').values_list(
+        'pk', flat=True)[:len(comments)])
+    for comment, pk in zip(comments, reversed(ids)):
+        comment.pk = pk
+
+
+def write(objects):
+    """Записывает пачку одной транзакцией. Возвращает записанные объекты."""
+    comments = [obj for obj in objects if isinstance(obj, Comment)]
+    follows = [obj for obj in objects if isinstance(obj, Follow)]
+    with transaction.atomic():
+        if follows:
+            follows = _new_follows(follows)
+            Follow.objects.bulk_create(follows, ignore_conflicts=True)
+            follows_added(follows)
+        if comments:
+            Comment.objects.bulk_create(comments)
+            _assign_ids(comments)
+            comments_added(comments)
+    return comments + follows
+
+
+def get_buffer():
+    """Буфер процесса или None, если он выключен."""
+    global _buffer
+    if not settings.WRITE_BUFFER_ENABLED:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBuffer(
+                settings.WRITE_BUFFER_MAX_ITEMS,
+                settings.WRITE_BUFFER_MAX_DELAY)
+    return _buffer
+
+
+def reset():
+    """Забывает буфер: следующий get_buffer() создаст новый по настройкам."""
+    global _buffer
+    with _buffer_lock:
+        _buffer = None
+
+
+def save(obj):
+    """Сохраняет новый Comment или Follow через буфер, если он включён.
+
+    Возвращает False для подписки, которая уже была.
+    """
+    buffer = get_buffer()
+    if buffer is None:
+        if isinstance(obj, Follow):
+            return Follow.objects.get_or_create(
+                user_id=obj.user_id, author_id=obj.author_id)[1]
+        obj.save()
+        return True
+    return buffer.submit(obj).result(WAIT_TIMEOUT)
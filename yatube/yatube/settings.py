@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
+    'core.replicas.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,6 +81,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# ASGI-вход (см. core/asgi.py): потоки для Django и предел очереди к ним
+ASGI_THREADS = int(os.environ.get('YATUBE_ASGI_THREADS', 16))
+ASGI_MAX_PENDING = int(os.environ.get('YATUBE_ASGI_MAX_PENDING', 1000))
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -90,6 +96,34 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения лент (см. core/replicas.py): пути к копиям
+# базы SQLite через запятую. После записи клиент и данные, в которые
+# писали, читаются с основной базы REPLICA_PIN_SECONDS секунд.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.environ.get('YATUBE_DB_REPLICAS', '').split(','))):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+
+# PRAGMA для каждого нового соединения с SQLite (см. core/sqlite.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': os.environ.get('YATUBE_SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('YATUBE_SQLITE_BUSY_TIMEOUT', 5000)),
+    'mmap_size': int(
+        os.environ.get('YATUBE_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Отрицательное значение - размер в КиБ, а не в страницах
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -127,6 +161,13 @@ LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
 
+# Лента подписок: авторам с таким числом подписчиков посты не рассылаются,
+# лента подписчика дочитывает их сама
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов автора копируется в ленту при подписке (две
+# страницы), более старые лента дочитывает сама
+TIMELINE_BACKFILL_SIZE = 20
+
 #  подключаем движок filebased.EmailBackend
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 # указываем директорию, в которую будут складываться файлы писем
@@ -136,6 +177,12 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+# collectstatic пишет файлы с хешем в имени и сжатые копии, а WSGI-вход
+# отдаёт их сам (см. core/staticfiles.py). Файлы без хеша кешируются
+# браузером на STATIC_MAX_AGE секунд.
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStaticFilesStorage'
+STATIC_MAX_AGE = 60
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -144,9 +191,77 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_ROOT_TEST = os.path.join(BASE_DIR, 'media_test')
 
+# Обработка загруженных картинок постов (см. posts/images.py)
+IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40 * 10 ** 6
+IMAGE_MAX_SIDE = 1920
+IMAGE_QUALITY = 85
+
+# Потоки, которые заранее режут миниатюры загруженных картинок
+# (см. posts/thumbnails.py); 0 - резать сразу в потоке запроса
+THUMBNAIL_WORKERS = int(os.environ.get('YATUBE_THUMBNAIL_WORKERS', 2))
+# Сборка мусора в медиафайлах (см. posts/media_gc.py) не трогает файлы,
+# изменённые меньше MEDIA_GC_GRACE секунд назад
+MEDIA_GC_GRACE = int(os.environ.get('YATUBE_MEDIA_GC_GRACE', 60 * 60))
+
+
+# Кеш выбирается переменной окружения YATUBE_CACHE:
+#   locmem - в памяти процесса (по умолчанию);
+#   sqlite - общий для всех воркеров файл SQLite с LRU-вытеснением;
+#   file   - общий каталог файлового кеша Django.
+# YATUBE_CACHE_LOCATION задаёт путь, YATUBE_CACHE_MAX_ENTRIES и
+# YATUBE_CACHE_MAX_SIZE (байт) - пределы размера.
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'sqlite': ('core.cache.SQLiteCache',
+               os.path.join(BASE_DIR, 'cache', 'cache.sqlite3')),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache',
+             os.path.join(BASE_DIR, 'cache', 'files')),
+}
+CACHE_BACKEND, CACHE_LOCATION = CACHE_BACKENDS[
+    os.environ.get('YATUBE_CACHE', 'locmem')]
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION', CACHE_LOCATION),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.environ.get('YATUBE_CACHE_MAX_ENTRIES', 10000)),
+        },
     }
 }
+if CACHE_BACKEND == 'core.cache.SQLiteCache':
+    CACHES['default']['OPTIONS']['MAX_SIZE'] = int(
+        os.environ.get('YATUBE_CACHE_MAX_SIZE', 64 * 1024 * 1024))
+
+# Страницы постов кешируются до изменения их данных (см. posts/caching.py),
+# таймаут только ограничивает жизнь устаревших поколений в кеше
+POSTS_PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+# Сколько новых постов группы хранится готовым списком (см. posts/groupfeed.py)
+GROUP_FEED_SIZE = 200
+# Отрендеренные карточки постов (см. posts/cards.py)
+POSTS_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Буфер записи комментариев и подписок (см. posts/writebuffer.py): пачка
+# пишется, когда набралось MAX_ITEMS записей или прошло MAX_DELAY секунд
+WRITE_BUFFER_ENABLED = os.environ.get('YATUBE_WRITE_BUFFER', '') == '1'
+WRITE_BUFFER_MAX_ITEMS = 100
+WRITE_BUFFER_MAX_DELAY = 0.02
+
+# Профилирование запросов (см. core/profiling.py): Server-Timing и строка
+# JSON в логгер core.profiling для доли запросов PROFILING_SAMPLE_RATE
+PROFILING_ENABLED = os.environ.get('YATUBE_PROFILING', '') == '1'
+PROFILING_SAMPLE_RATE = float(
+    os.environ.get('YATUBE_PROFILING_SAMPLE_RATE', 1))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.profiling': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
@@ -11,6 +11,10 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from core.staticfiles import wrap
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
-application = get_wsgi_application()
+# Статику из STATIC_ROOT отдаёт обёртка, не доходя до Django
+# (см. core/staticfiles.py)
+application = wrap(get_wsgi_application())